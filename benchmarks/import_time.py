@@ -0,0 +1,68 @@
+"""
+Measure how long importing the app takes, using `python -X importtime`.
+
+Usage: python benchmarks/import_time.py [--runs 5] [--top 15] [--budget SECONDS]
+
+Imports main (as gunicorn's preload does) in fresh interpreters and reports the median
+cumulative import time, the slowest modules of the last run, and any deferred report, chart
+or LLM module (see warmup.DEFERRED_MODULES) that was imported at startup. Exits non-zero if
+the median exceeds --budget or a deferred module was imported, so it can guard against
+regressions in CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from warmup import DEFERRED_MODULES
+
+def import_main():
+    """Import main in a fresh interpreter; returns {module: (self us, cumulative us, depth)}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, 'WARMUP_IMPORTS': 'false'}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing main failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to time')
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to list')
+    parser.add_argument('--budget', type=float, help='fail if the median import of main takes longer (seconds)')
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        modules = import_main()
+        timings.append(modules['main'][1] / 1e6)
+    median = statistics.median(timings)
+
+    print(f"import main: median {median:.3f}s over {args.runs} runs (min {min(timings):.3f}s, max {max(timings):.3f}s)")
+    print(f"\n{'self s':>8} {'cumul s':>8}  module (slowest by cumulative time, last run)")
+    slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us, depth) in slowest[:args.top]:
+        print(f"{self_us / 1e6:>8.3f} {cumulative_us / 1e6:>8.3f}  {name}")
+
+    eager = [name for name in DEFERRED_MODULES if name in modules]
+    if eager:
+        print(f"\nDeferred modules imported at startup: {', '.join(eager)}")
+
+    if eager or (args.budget is not None and median > args.budget):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Load test: hold many progress streams open while uploads keep coming in.
+
+Usage: python benchmarks/sse_load.py --url http://localhost:5000 [--streams 1000] [--uploads 50]
+
+Start the server first, e.g. GUNICORN_WORKER_CLASS=gevent gunicorn -c gunicorn.conf.py main:app
+(raise the open file limit with `ulimit -n` for large stream counts). The script uploads a
+generated CSV, opens --streams SSE connections to /sessions/<id>/progress, then runs
+--uploads uploads (--upload-concurrency at a time) and reports how many streams stayed
+connected, how quickly they got their first frame, and upload latency while they were open.
+Only the standard library is used.
+
+With the default memory session backend the streams are fed by the in-process broker alone.
+Start the server with SESSION_BACKEND=disk (as multi-worker deployments use) to measure the
+path where progress written by job workers is polled from the shared store.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from urllib.parse import urlsplit
+
+WORDS = ('service', 'staff', 'wait', 'price', 'friendly', 'slow', 'clean', 'parking', 'app', 'helpful')
+
+def generate_csv(rows):
+    rng = random.Random(rows)
+    lines = ['Respondent ID,Comments,Score']
+    for row in range(rows):
+        comment = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+        lines.append(f'{row},"{comment}",{rng.randint(1, 10)}')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+async def http_request(host, port, method, path, body=b'', headers=None):
+    """Minimal HTTP/1.1 request; returns (status, body)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", 'Connection: close',
+                f"Content-Length: {len(body)}"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    header, _, payload = response.partition(b'\r\n\r\n')
+    status = int(header.split(b' ', 2)[1])
+    if b'transfer-encoding: chunked' in header.lower():
+        payload = dechunk(payload)
+    return status, payload
+
+def dechunk(payload):
+    body = b''
+    while payload:
+        size_line, _, payload = payload.partition(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        if size == 0:
+            break
+        body += payload[:size]
+        payload = payload[size + 2:]
+    return body
+
+async def upload(host, port, csv_bytes):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"load.csv\"\r\n"
+        f"Content-Type: text/csv\r\n\r\n"
+    ).encode('utf-8') + csv_bytes + f"\r\n--{boundary}--\r\n".encode('utf-8')
+    status, payload = await http_request(
+        host, port, 'POST', '/upload', body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+    )
+    if status != 200:
+        raise RuntimeError(f"Upload failed with {status}: {payload[:200]!r}")
+    return json.loads(payload)['session_id']
+
+async def hold_stream(host, port, session_id, stats, stop):
+    """Open a progress stream and count frames until stop is set"""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats['connect_errors'] += 1
+        return
+    try:
+        writer.write((f"GET /sessions/{session_id}/progress HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                      "Accept: text/event-stream\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+        stats['connected'] += 1
+        first_frame = True
+        while not stop.is_set():
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                stats['dropped'] += 1
+                return
+            if line.startswith(b'data:') or line.startswith(b':'):
+                stats['heartbeats' if line.startswith(b':') else 'events'] += 1
+                if first_frame:
+                    stats['first_frame'].append(time.perf_counter() - started)
+                    first_frame = False
+    finally:
+        writer.close()
+
+async def run(args):
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+    csv_bytes = generate_csv(args.rows)
+
+    session_id = await upload(host, port, csv_bytes)
+    print(f"Streaming progress of session {session_id}")
+
+    stats = {'connected': 0, 'connect_errors': 0, 'dropped': 0, 'events': 0, 'heartbeats': 0, 'first_frame': []}
+    stop = asyncio.Event()
+    streams = []
+    for _ in range(args.streams):
+        streams.append(asyncio.ensure_future(hold_stream(host, port, session_id, stats, stop)))
+        # Ramp up gradually instead of flooding the listen backlog
+        await asyncio.sleep(args.ramp / max(args.streams, 1))
+    await asyncio.sleep(1)
+
+    # Uploads while every stream is held open
+    semaphore = asyncio.Semaphore(args.upload_concurrency)
+    latencies = []
+    failures = 0
+
+    async def timed_upload():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await upload(host, port, csv_bytes)
+                latencies.append(time.perf_counter() - started)
+            except (OSError, RuntimeError):
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_upload() for _ in range(args.uploads)))
+    upload_seconds = time.perf_counter() - started
+    await asyncio.sleep(args.hold)
+
+    stop.set()
+    await asyncio.gather(*streams)
+
+    first_frame = sorted(stats['first_frame'])
+    print(f"streams: {stats['connected']}/{args.streams} connected, {stats['connect_errors']} connect errors, "
+          f"{stats['dropped']} dropped by the server")
+    if first_frame:
+        print(f"first frame: median {statistics.median(first_frame) * 1000:.0f}ms, "
+              f"p95 {first_frame[int(len(first_frame) * 0.95) - 1] * 1000:.0f}ms")
+    print(f"frames: {stats['events']} events, {stats['heartbeats']} heartbeats")
+    if latencies:
+        latencies.sort()
+        print(f"uploads: {len(latencies)} ok, {failures} failed in {upload_seconds:.1f}s; latency median "
+              f"{statistics.median(latencies) * 1000:.0f}ms, p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms")
+    else:
+        print(f"uploads: all {failures} failed")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--streams', type=int, default=1000, help='progress streams to hold open')
+    parser.add_argument('--uploads', type=int, default=50, help='uploads to run while streams are open')
+    parser.add_argument('--upload-concurrency', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=2000, help='rows in the uploaded CSV')
+    parser.add_argument('--ramp', type=float, default=5.0, help='seconds over which streams are opened')
+    parser.add_argument('--hold', type=float, default=20.0,
+                        help='seconds to keep streams open after the uploads (set above the heartbeat interval)')
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare the streaming XLSX reader with pandas' read_excel on generated workbooks.
+
+Usage: python benchmarks/xlsx_ingest.py [--rows 10000 100000 500000] [--columns 30]
+
+Each reader runs in a fresh process so peak memory (max RSS) isn't shared between runs.
+Generated workbooks are kept in benchmarks/data and reused.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+VERBATIM_COLUMN = 'How can we improve this service?'
+WORDS = ('service', 'staff', 'wait', 'price', 'friendly', 'slow', 'clean', 'parking', 'app', 'helpful',
+         'online', 'booking', 'queue', 'rude', 'great', 'expensive', 'quick', 'easy', 'broken', 'support')
+
+def generate_workbook(path, rows, columns):
+    from openpyxl import Workbook
+
+    rng = random.Random(rows)
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Responses')
+    other_columns = [f"Q{i}" for i in range(1, columns)]
+    worksheet.append(['Respondent ID', VERBATIM_COLUMN] + other_columns)
+    for row in range(rows):
+        comment = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 40)))
+        worksheet.append([row, comment] + [rng.randint(1, 10) for _ in other_columns])
+    workbook.save(path)
+
+def run_reader(reader, path, queue):
+    import pandas as pd
+    from ingest import read_xlsx_columns
+
+    start = time.perf_counter()
+    if reader == 'pandas':
+        df = pd.read_excel(path, engine='openpyxl')
+    else:
+        df = read_xlsx_columns(path, columns=[VERBATIM_COLUMN], text_columns=[VERBATIM_COLUMN])
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    queue.put((elapsed, len(df), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+def measure(reader, path):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_reader, args=(reader, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--columns', type=int, default=30, help='columns per workbook (including the verbatim column)')
+    args = parser.parse_args()
+
+    os.makedirs(DATA_FOLDER, exist_ok=True)
+    print(f"{'rows':>8} {'reader':>10} {'seconds':>9} {'peak MB':>9}")
+    for rows in args.rows:
+        path = os.path.join(DATA_FOLDER, f"survey_{rows}x{args.columns}.xlsx")
+        if not os.path.exists(path):
+            print(f"Generating {path}...", file=sys.stderr)
+            generate_workbook(path, rows, args.columns)
+
+        for reader in ('pandas', 'streaming'):
+            elapsed, row_count, peak_mb = measure(reader, path)
+            assert row_count == rows, f"{reader} read {row_count} rows, expected {rows}"
+            print(f"{rows:>8} {reader:>10} {elapsed:>9.2f} {peak_mb:>9.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,37 @@
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import io
-import base64
-from PIL import Image
+import re
+import struct
+from functools import lru_cache
+from matplotlib.figure import Figure
 
-def generate_chart_image(category_data, chart_type='horizontal_bar'):
-    """Generate a chart image for WeasyPrint PDF generation"""
-    
+# Rendered charts kept in memory, keyed by their category counts and render settings
+CHART_CACHE_SIZE = 64
+
+# Define colors matching the HTML design
+COLORS = ['#16a085', '#27ae60', '#2c3e50', '#f39c12', '#e74c3c', '#9b59b6', '#3498db', '#95a5a6']
+
+def generate_chart_image(category_data, chart_type='horizontal_bar', image_format='png', dpi=150):
+    """
+    Render a category chart, returning (image bytes, width, height).
+    
+    Width and height are in points. image_format is 'png' or 'svg'. Charts are cached by
+    their counts and settings, so repeated reports of the same results don't re-render.
+    """
+    key = tuple((cat['title'], int(cat['count']), round(float(cat['percentage']), 1)) for cat in category_data)
+    return _render_chart(key, chart_type, image_format, dpi)
+
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+def _render_chart(category_key, chart_type, image_format, dpi):
     # Extract data
-    categories = [cat['title'] for cat in category_data]
-    counts = [cat['count'] for cat in category_data]
-    percentages = [cat['percentage'] for cat in category_data]
+    categories = [title for title, _, _ in category_key]
+    counts = [count for _, count, _ in category_key]
+    percentages = [percentage for _, _, percentage in category_key]
     
-    # Create figure and axis
-    fig, ax = plt.subplots(figsize=(12, 8))
+    # A Figure that isn't registered with pyplot, so concurrent requests don't share state
+    fig = Figure(figsize=(12, 8))
+    ax = fig.subplots()
     
-    # Define colors matching the HTML design
-    colors = ['#16a085', '#27ae60', '#2c3e50', '#f39c12', '#e74c3c', '#9b59b6', '#3498db', '#95a5a6']
-    bar_colors = [colors[i % len(colors)] for i in range(len(categories))]
+    bar_colors = [COLORS[i % len(COLORS)] for i in range(len(categories))]
     
     if chart_type == 'horizontal_bar':
         # Create horizontal bar chart
@@ -26,8 +40,8 @@ def generate_chart_image(category_data, chart_type='horizontal_bar'):
         # Add value labels on bars
         for i, (bar, count, percentage) in enumerate(zip(bars, counts, percentages)):
             width = bar.get_width()
-            ax.text(width + max(counts) * 0.01, bar.get_y() + bar.get_height()/2, 
-                   f'{count} ({percentage:.1f}%)', 
+            ax.text(width + max(counts) * 0.01, bar.get_y() + bar.get_height()/2,
+                   f'{count} ({percentage:.1f}%)',
                    ha='left', va='center', fontsize=10, fontweight='bold')
         
         ax.set_xlabel('Number of Responses', fontsize=12, fontweight='bold')
@@ -35,7 +49,7 @@ def generate_chart_image(category_data, chart_type='horizontal_bar'):
         
         # Invert y-axis to match data order
         ax.invert_yaxis()
-        
+    
     else:  # vertical bar chart
         bars = ax.bar(categories, counts, color=bar_colors)
         
@@ -43,14 +57,16 @@ def generate_chart_image(category_data, chart_type='horizontal_bar'):
         for bar, count, percentage in zip(bars, counts, percentages):
             height = bar.get_height()
             ax.text(bar.get_x() + bar.get_width()/2., height + max(counts) * 0.01,
-                   f'{count}\n({percentage:.1f}%)', 
+                   f'{count}\n({percentage:.1f}%)',
                    ha='center', va='bottom', fontsize=10, fontweight='bold')
         
         ax.set_ylabel('Number of Responses', fontsize=12, fontweight='bold')
         ax.set_title('Category Distribution', fontsize=16, fontweight='bold', pad=20)
         
         # Rotate x-axis labels for better readability
-        plt.xticks(rotation=45, ha='right')
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_ha('right')
     
     # Style the chart
     ax.grid(True, alpha=0.3, linestyle='--')
@@ -66,38 +82,23 @@ def generate_chart_image(category_data, chart_type='horizontal_bar'):
     # Style the tick labels
     ax.tick_params(colors='#2c3e50', labelsize=10)
     
-    # Tight layout
-    plt.tight_layout()
-    
-    # Save to BytesIO
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight', 
-                facecolor='white', edgecolor='none')
-    buffer.seek(0)
-    
-    # Convert to base64 for embedding in HTML
-    image_base64 = base64.b64encode(buffer.getvalue()).decode()
-    
-    plt.close()  # Close the figure to free memory
-    
-    return image_base64
+    return save_figure(fig, image_format, dpi)
 
-def generate_pie_chart(category_data):
-    """Generate a pie chart image"""
+def generate_pie_chart(category_data, image_format='png', dpi=150):
+    """Generate a pie chart image, returning (image bytes, width, height) like generate_chart_image"""
     
     # Extract data
     categories = [cat['title'] for cat in category_data]
     counts = [cat['count'] for cat in category_data]
     
     # Create figure and axis
-    fig, ax = plt.subplots(figsize=(10, 8))
+    fig = Figure(figsize=(10, 8))
+    ax = fig.subplots()
     
-    # Define colors matching the HTML design
-    colors = ['#16a085', '#27ae60', '#2c3e50', '#f39c12', '#e74c3c', '#9b59b6', '#3498db', '#95a5a6']
-    pie_colors = [colors[i % len(colors)] for i in range(len(categories))]
+    pie_colors = [COLORS[i % len(COLORS)] for i in range(len(categories))]
     
     # Create pie chart
-    wedges, texts, autotexts = ax.pie(counts, labels=categories, colors=pie_colors, 
+    wedges, texts, autotexts = ax.pie(counts, labels=categories, colors=pie_colors,
                                       autopct='%1.1f%%', startangle=90)
     
     # Style the text
@@ -118,18 +119,28 @@ def generate_pie_chart(category_data):
     # Set background
     fig.patch.set_facecolor('white')
     
-    # Tight layout
-    plt.tight_layout()
-    
-    # Save to BytesIO
+    return save_figure(fig, image_format, dpi)
+
+def save_figure(fig, image_format, dpi):
+    """Serialize a figure to PNG or SVG, returning (image bytes, width, height) in points"""
+    fig.tight_layout()
     buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight', 
+    fig.savefig(buffer, format=image_format, dpi=dpi, bbox_inches='tight',
                 facecolor='white', edgecolor='none')
-    buffer.seek(0)
-    
-    # Convert to base64 for embedding in HTML
-    image_base64 = base64.b64encode(buffer.getvalue()).decode()
-    
-    plt.close()  # Close the figure to free memory
-    
-    return image_base64
\ No newline at end of file
+    data = buffer.getvalue()
+    
+    if image_format == 'svg':
+        width, height = svg_size(data)
+    else:
+        width, height = png_size(data)
+        width, height = width * 72 / dpi, height * 72 / dpi
+    return data, width, height
+
+def png_size(data):
+    """Pixel width and height from a PNG's header"""
+    return struct.unpack('>II', data[16:24])
+
+def svg_size(data):
+    """Width and height in points from the root element of a matplotlib SVG"""
+    match = re.search(rb'<svg[^>]*\swidth="([\d.]+)pt"[^>]*\sheight="([\d.]+)pt"', data)
+    return float(match.group(1)), float(match.group(2))
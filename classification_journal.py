@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+def journal_path(upload_folder, session_id):
+    """Location of a session's classification journal"""
+    return os.path.join(upload_folder, f"{session_id}_journal.sqlite3")
+
+def _comment_hash(comment):
+    return hashlib.sha256(str(comment).encode('utf-8')).hexdigest()
+
+class ClassificationJournal:
+    """
+    Checkpoint of completed batch results for one session's classification run.
+
+    Each row records the comment's hash alongside its category, so entries are only
+    reused when the same text is being classified again. The journal is reset when
+    the run key (category set and model) changes.
+    """
+
+    def __init__(self, path, run_key):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'row_index TEXT PRIMARY KEY, '
+                'comment_hash TEXT NOT NULL, '
+                'category TEXT NOT NULL, '
+                'recorded_at REAL NOT NULL)'
+            )
+            row = conn.execute("SELECT value FROM meta WHERE name = 'run_key'").fetchone()
+            if row is None or row[0] != run_key:
+                conn.execute('DELETE FROM results')
+                conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('run_key', ?)", (run_key,))
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_run_key(category_hash, category_titles, model):
+        """
+        Identify a run by its categories (titles and descriptions, as hashed by
+        llm_cache.category_set_hash), the label set and the model, so editing a
+        description discards labels journaled under the old definitions.
+        """
+        return hashlib.sha256(json.dumps([category_hash, list(category_titles), model]).encode('utf-8')).hexdigest()
+
+    def completed(self, comments):
+        """Return {row index: category} for journaled rows whose text is unchanged"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT row_index, comment_hash, category FROM results').fetchall()
+        journaled = {row_index: (comment_hash, category) for row_index, comment_hash, category in rows}
+
+        completed = {}
+        for idx, comment in comments.items():
+            entry = journaled.get(str(idx))
+            if entry and entry[0] == _comment_hash(comment):
+                completed[idx] = entry[1]
+        return completed
+
+    def record(self, classifications, comments):
+        """Persist a finished batch's {row index: category} results"""
+        now = time.time()
+        rows = [
+            (str(idx), _comment_hash(comments[idx]), category, now)
+            for idx, category in classifications.items()
+            if category is not None
+        ]
+        if not rows:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO results (row_index, comment_hash, category, recorded_at) VALUES (?, ?, ?, ?)',
+                rows
+            )
+
+def discard_journal(upload_folder, session_id):
+    """Delete a session's journal so the next run starts from scratch"""
+    path = journal_path(upload_folder, session_id)
+    if os.path.exists(path):
+        os.remove(path)
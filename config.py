@@ -4,16 +4,92 @@ from datetime import timedelta
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'tmp')
-    MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB max file size
+    MAX_CONTENT_LENGTH = int(float(os.environ.get('MAX_UPLOAD_MB', '100')) * 1024 * 1024)  # max file size
+    # Chunked uploads (/uploads): largest accepted file and size of each chunk (below MAX_CONTENT_LENGTH)
+    MAX_CHUNKED_UPLOAD_BYTES = int(float(os.environ.get('MAX_CHUNKED_UPLOAD_MB', '1024')) * 1024 * 1024)
+    UPLOAD_CHUNK_SIZE = int(float(os.environ.get('UPLOAD_CHUNK_MB', '4')) * 1024 * 1024)
     ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
     
     # OpenAI API key
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     
+    # Model used for comment classification
+    CLASSIFICATION_MODEL = os.environ.get('CLASSIFICATION_MODEL', 'gpt-4o')
+    
+    # Model used for report insights (part of the insights cache key)
+    INSIGHTS_MODEL = os.environ.get('INSIGHTS_MODEL', 'gpt-4o')
+    
+    # OpenAI rate limits for the classification model. Unset means unknown until the first
+    # response reports the account's limits in its headers (which then take precedence).
+    OPENAI_RPM_LIMIT = int(os.environ['OPENAI_RPM_LIMIT']) if os.environ.get('OPENAI_RPM_LIMIT') else None
+    OPENAI_TPM_LIMIT = int(os.environ['OPENAI_TPM_LIMIT']) if os.environ.get('OPENAI_TPM_LIMIT') else None
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '10'))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '5'))
+    
+    # LLM batch packing budgets (estimated tokens per request)
+    BATCH_MAX_INPUT_TOKENS = int(os.environ.get('BATCH_MAX_INPUT_TOKENS', '3000'))
+    BATCH_MAX_OUTPUT_TOKENS = int(os.environ.get('BATCH_MAX_OUTPUT_TOKENS', '1500'))
+    BATCH_MAX_COMMENTS = int(os.environ.get('BATCH_MAX_COMMENTS', '50'))
+    
+    # Model used for semantic re-checks of low-confidence classifications
+    EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'text-embedding-3-small')
+    
+    # Classification mode: 'llm' or 'embedding' (embedding-first, LLM only for ambiguous rows)
+    CLASSIFICATION_MODE = os.environ.get('CLASSIFICATION_MODE', 'llm')
+    # Minimum top-1/top-2 cosine similarity margin for resolving a comment locally
+    EMBEDDING_MARGIN_THRESHOLD = float(os.environ.get('EMBEDDING_MARGIN_THRESHOLD', '0.05'))
+    
+    # Duplicate collapsing before classification: 'off', 'exact' or 'near'
+    DEDUP_MODE = os.environ.get('DEDUP_MODE', 'exact')
+    NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', '0.9'))
+    
+    # Session storage: 'memory' (single worker) or 'disk' (shared by all workers on the box)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+    SESSION_DB_PATH = os.path.join(UPLOAD_FOLDER, 'sessions.sqlite3')
+    # Memory budget for session data per worker; least recently used sessions are spilled
+    # to UPLOAD_FOLDER and reloaded on access (0 disables the limit)
+    SESSION_MEMORY_BUDGET_MB = float(os.environ.get('SESSION_MEMORY_BUDGET_MB', '512'))
+    
+    # Where classification runs: 'thread' (in the web worker) or 'process' (local job workers)
+    JOB_BACKEND = os.environ.get('JOB_BACKEND', 'thread')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+    JOB_QUEUE_PATH = os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3')
+    
+    # Persistent caches (kept outside UPLOAD_FOLDER so cleanup doesn't remove them)
+    CACHE_FOLDER = os.environ.get('CACHE_FOLDER') or os.path.join(os.getcwd(), 'cache')
+    CLASSIFICATION_CACHE_PATH = os.path.join(CACHE_FOLDER, 'classifications.sqlite3')
+    EMBEDDING_CACHE_PATH = os.path.join(CACHE_FOLDER, 'embeddings.sqlite3')
+    
+    # Upload parsing: rows sampled for verbatim column detection, rows per streamed CSV
+    # chunk, and which other columns to keep ('all', or 'selected' for only the ones the
+    # client lists in passthrough_columns)
+    UPLOAD_SAMPLE_ROWS = int(os.environ.get('UPLOAD_SAMPLE_ROWS', '1000'))
+    CSV_CHUNK_ROWS = int(os.environ.get('CSV_CHUNK_ROWS', '100000'))
+    UPLOAD_KEEP_COLUMNS = os.environ.get('UPLOAD_KEEP_COLUMNS', 'all')
+    
+    # Progress streams: seconds between heartbeat frames, and how often to re-read progress
+    # written by other processes (job workers or other web workers with the disk backend)
+    PROGRESS_HEARTBEAT_SECONDS = float(os.environ.get('PROGRESS_HEARTBEAT_SECONDS', '15'))
+    PROGRESS_SHARED_POLL_SECONDS = float(os.environ.get('PROGRESS_SHARED_POLL_SECONDS', '1'))
+    # A run in a web worker whose progress heartbeat is older than this is treated as
+    # abandoned (its worker died) and can be started again, resuming from its checkpoint
+    CLASSIFICATION_STALE_SECONDS = float(os.environ.get('CLASSIFICATION_STALE_SECONDS', '900'))
+    
+    # PDF report chart: 'png' (raster at CHART_DPI) or 'svg' (vector, needs svglib; falls
+    # back to png without it)
+    CHART_FORMAT = os.environ.get('CHART_FORMAT', 'png')
+    CHART_DPI = int(os.environ.get('CHART_DPI', '150'))
+    
+    # Report, chart and LLM libraries are imported on first use; pre-warm them in the
+    # background this many seconds after a worker starts serving
+    WARMUP_IMPORTS = os.environ.get('WARMUP_IMPORTS', 'true').lower() == 'true'
+    WARMUP_DELAY_SECONDS = float(os.environ.get('WARMUP_DELAY_SECONDS', '1'))
+    
     # Cleanup settings
     CLEANUP_INTERVAL = timedelta(minutes=30)
     
     @staticmethod
     def init_app(app):
         # Ensure upload folder exists
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
\ No newline at end of file
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
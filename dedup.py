@@ -0,0 +1,113 @@
+import zlib
+import numpy as np
+import pandas as pd
+
+# MinHash settings for near-duplicate detection
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+SHINGLE_SIZE = 3
+_HASH_PRIME = 4294967291  # largest prime below 2**32
+
+def normalize_for_dedup(comments):
+    """Lowercase, strip punctuation and collapse whitespace for a Series of comments"""
+    keys = (
+        comments.astype(str)
+        .str.casefold()
+        .str.replace(r'[^\w\s]', '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+    # Punctuation-only comments ("?", "...") keep their raw text as the key
+    empty = keys == ''
+    if empty.any():
+        keys[empty] = comments[empty].astype(str).str.strip()
+    return keys
+
+def collapse_duplicates(comments, mode='exact', threshold=0.9):
+    """
+    Group duplicate comments so only one representative per group is classified.
+
+    Returns (representatives, representative_of) where representatives is the subset
+    of comments to classify and representative_of maps every row index in comments
+    to the index of its group's representative.
+    """
+    if mode == 'off' or len(comments) == 0:
+        return comments, pd.Series(comments.index, index=comments.index)
+
+    keys = normalize_for_dedup(comments)
+    first_mask = ~keys.duplicated()
+    key_to_rep = pd.Series(comments.index[first_mask.values], index=keys[first_mask].values)
+    representative_of = keys.map(key_to_rep)
+
+    if mode == 'near':
+        rep_keys = keys[first_mask]
+        rep_remap = near_duplicate_groups(rep_keys, threshold)
+        representative_of = representative_of.map(rep_remap)
+
+    representatives = comments.loc[representative_of.unique()]
+    return representatives, representative_of
+
+def expand_classifications(classifications, representative_of):
+    """Fan representative classifications back out to every row in their group, as a Series"""
+    return representative_of.map(classifications).dropna()
+
+def near_duplicate_groups(keys, threshold):
+    """
+    Cluster normalized comments whose estimated Jaccard similarity of character
+    shingles is at least threshold, using MinHash signatures with LSH banding.
+
+    Returns a dict mapping each index in keys to the index of its cluster representative.
+    """
+    indices = list(keys.index)
+    if len(indices) < 2:
+        return {idx: idx for idx in indices}
+
+    signatures = np.vstack([minhash_signature(text) for text in keys.tolist()])
+
+    parent = list(range(len(indices)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows_per_band = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    for band in range(MINHASH_BANDS):
+        band_slice = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        buckets = {}
+        for position, band_values in enumerate(band_slice):
+            buckets.setdefault(band_values.tobytes(), []).append(position)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            anchor = members[0]
+            for other in members[1:]:
+                root_a, root_b = find(anchor), find(other)
+                if root_a == root_b:
+                    continue
+                similarity = np.mean(signatures[anchor] == signatures[other])
+                if similarity >= threshold:
+                    # Keep the earliest row as the representative
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return {idx: indices[find(position)] for position, idx in enumerate(indices)}
+
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, _HASH_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, _HASH_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+def minhash_signature(text):
+    """MinHash signature of a string's character shingles"""
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    # Universal hashing; all operands are below 2**32 so the arithmetic can't overflow uint64
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _HASH_PRIME
+    return permuted.min(axis=1)
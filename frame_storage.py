@@ -0,0 +1,74 @@
+import os
+import pandas as pd
+from session_store import estimate_size
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is optional
+    feather = None
+
+CATEGORY_COLUMN = 'Comment Category'
+
+def save_frame(df, base_path):
+    """
+    Persist an uploaded DataFrame once, returning the written path.
+
+    Uses uncompressed Feather (Arrow IPC) so it can be memory-mapped and read one
+    column at a time; falls back to pickle when pyarrow is unavailable or the frame
+    can't be represented in Arrow (e.g. non-string headers or mixed-type columns).
+    """
+    # Files are replaced atomically so readers holding a memory map keep a valid file
+    if feather is not None and all(isinstance(col, str) for col in df.columns):
+        path = f"{base_path}.feather"
+        try:
+            feather.write_feather(df, f"{path}.tmp", compression='uncompressed')
+            os.replace(f"{path}.tmp", path)
+            return path
+        except Exception:
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+
+    path = f"{base_path}.pkl"
+    df.to_pickle(f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return path
+
+def load_frame(path, columns=None):
+    """Load a stored frame, memory-mapping Feather files and reading only the requested columns"""
+    if path.endswith('.feather'):
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return table.to_pandas()
+
+    df = pd.read_pickle(path)
+    return df[columns] if columns is not None else df
+
+def add_columns(session, extra):
+    """Store extra columns alongside a session's data, returning the new data path"""
+    df = session_frame(session)
+    for col in extra.columns:
+        df[col] = extra[col].values
+    data_path = session['data_path']
+    new_path = save_frame(df, os.path.splitext(data_path)[0])
+    if new_path != data_path and os.path.exists(data_path):
+        os.remove(data_path)
+    return new_path
+
+def session_frame(session, columns=None):
+    """The uploaded data for a session (optionally only some columns)"""
+    return load_frame(session['data_path'], columns)
+
+def classified_frame(session, columns=None):
+    """The uploaded data joined with its 'Comment Category' labels, or None if not classified"""
+    labels = session.get('labels')
+    if labels is None:
+        return None
+    df = session_frame(session, columns)
+    df[CATEGORY_COLUMN] = labels.reindex(df.index)
+    return df
+
+def session_memory_usage(session):
+    """Approximate bytes held in memory by a session and bytes it occupies on disk"""
+    resident = estimate_size(session)
+    data_path = session.get('data_path')
+    on_disk = os.path.getsize(data_path) if data_path and os.path.exists(data_path) else 0
+    return {'resident_bytes': resident, 'on_disk_bytes': on_disk}
@@ -1,5 +1,23 @@
 # Gunicorn configuration for Railway deployment
 # Fixes worker timeout issues during long-running classification tasks
+import os
+
+# Worker class: "sync" (default) or "gevent". Sync workers hold a worker per open request,
+# so a single progress stream blocks everything else; gevent serves many idle SSE streams
+# and uploads concurrently in each worker.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded so its locks, sleeps and sockets cooperate
+    from gevent import monkey
+    monkey.patch_all()
+    
+    # asyncio classification runs can't share the gevent hub; run them in job worker
+    # processes unless configured otherwise. Their progress then reaches SSE streams by
+    # re-reading the store every PROGRESS_SHARED_POLL_SECONDS, once per session per web
+    # worker, and the broker fans each change out to all of that session's streams
+    # (benchmark both paths with benchmarks/sse_load.py)
+    os.environ.setdefault('JOB_BACKEND', 'process')
 
 # Worker timeout settings
 timeout = 300  # 5 minutes - allows time for OpenAI API batch processing
@@ -10,18 +28,23 @@ graceful_timeout = 30  # Time to gracefully shutdown workers
 keepalive = 10
 
 # Worker settings optimized for Railway
-workers = 1  # Single worker to avoid session sharing issues with in-memory storage
-worker_class = "sync"  # Sync workers for Flask app
-worker_connections = 1000
+# More than one worker requires SESSION_BACKEND=disk so sessions are shared between them
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', '1000'))  # Concurrent connections per gevent worker
 
 # Logging
 loglevel = "info"
 accesslog = "-"  # Log to stdout
 errorlog = "-"   # Log to stderr
 
-# Preload app for better performance
+# Preload app for better performance (report, chart and LLM libraries aren't imported
+# until first use, so this stays cheap)
 preload_app = True
 
+def post_worker_init(worker):
+    # Load the deferred libraries in the background once this worker is serving
+    from warmup import start_warmup
+    start_warmup(worker.app.wsgi())
+
 # Bind to Railway's expected interface
-import os
 bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
\ No newline at end of file
@@ -0,0 +1,231 @@
+import io
+import os
+import time
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    pa_csv = None
+
+# Size of the blocks the pyarrow reader parses at a time
+CSV_BLOCK_SIZE = 8 * 1024 * 1024
+
+# How often (in rows) the xlsx reader reports progress
+XLSX_PROGRESS_ROWS = 10000
+
+def growing_marker(filepath):
+    """Marker file present while a file is still being uploaded in chunks"""
+    return f"{filepath}.growing"
+
+def mark_growing(filepath):
+    with open(growing_marker(filepath), 'w') as f:
+        f.write('uploading')
+
+def finish_growing(filepath, failed=False):
+    """Signal readers that the file is complete (or that the upload failed)"""
+    marker = growing_marker(filepath)
+    if failed:
+        with open(marker, 'w') as f:
+            f.write('failed')
+    elif os.path.exists(marker):
+        os.remove(marker)
+
+class UploadStalled(ValueError):
+    """No chunks arrived for a while; the upload itself can still resume"""
+
+class GrowingFile(io.RawIOBase):
+    """
+    Reads a file that is still being written by a chunked upload.
+
+    At the end of the data written so far, reads wait for more until the growing marker
+    is removed; they raise ValueError if the upload fails, or UploadStalled if no data
+    arrives for stall_timeout seconds.
+    """
+
+    def __init__(self, filepath, poll_interval=0.2, stall_timeout=600):
+        super().__init__()
+        self._file = open(filepath, 'rb')
+        self._marker = growing_marker(filepath)
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        waiting_since = time.monotonic()
+        while True:
+            count = self._file.readinto(buffer)
+            if count:
+                return count
+            try:
+                with open(self._marker) as f:
+                    state = f.read()
+            except FileNotFoundError:
+                # Upload completed; anything written before the marker went away is readable
+                return self._file.readinto(buffer)
+            if state == 'failed':
+                raise ValueError('The upload failed before the file was complete')
+            if time.monotonic() - waiting_since > self.stall_timeout:
+                raise UploadStalled('The upload stalled before the file was complete')
+            time.sleep(self.poll_interval)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def open_source(filepath):
+    """Open a file for parsing, following it as it grows if it is still being uploaded"""
+    if os.path.exists(growing_marker(filepath)):
+        return io.BufferedReader(GrowingFile(filepath))
+    return open(filepath, 'rb')
+
+def xlsx_sheet_names(filepath):
+    """Names of the worksheets in a workbook, in order"""
+    workbook = load_workbook(filepath, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+def _header_names(header):
+    """Column names as pandas would produce them (unnamed and duplicate headers)"""
+    names = []
+    seen = {}
+    for position, value in enumerate(header):
+        name = f"Unnamed: {position}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def read_xlsx_columns(filepath, columns=None, text_columns=(), nrows=None, sheet=None, on_progress=None):
+    """
+    Stream an .xlsx worksheet row by row, materializing only the given columns.
+
+    Uses openpyxl's read-only mode, so the workbook is never loaded as a whole. sheet is
+    a worksheet name or position (default: the first sheet). The first row is the header;
+    trailing empty rows are dropped as pandas does. on_progress(rows_read, None) is called
+    periodically (compressed workbooks have no meaningful byte position).
+    """
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        if sheet is None:
+            worksheet = workbook.worksheets[0]
+        elif isinstance(sheet, int) or (sheet not in workbook.sheetnames and str(sheet).isdigit()):
+            worksheet = workbook.worksheets[int(sheet)]
+        else:
+            worksheet = workbook[sheet]
+
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame(columns=list(columns or []))
+
+        names = _header_names(header)
+        wanted = names if columns is None else list(columns)
+        missing = [col for col in wanted if col not in names]
+        if missing:
+            raise ValueError(f"Columns not found in worksheet: {', '.join(map(str, missing))}")
+        positions = [names.index(col) for col in wanted]
+
+        values = [[] for _ in wanted]
+        kept_rows = 0
+        last_non_empty = 0
+        for row in rows:
+            if nrows is not None and kept_rows >= nrows:
+                break
+            kept_rows += 1
+            if any(value is not None for value in row):
+                last_non_empty = kept_rows
+            for column_values, position in zip(values, positions):
+                column_values.append(row[position] if position < len(row) else None)
+            if on_progress is not None and kept_rows % XLSX_PROGRESS_ROWS == 0:
+                on_progress(kept_rows, None)
+    finally:
+        workbook.close()
+
+    if on_progress is not None:
+        on_progress(last_non_empty, None)
+    
+    data = {}
+    for col, column_values in zip(wanted, values):
+        column_values = column_values[:last_non_empty]
+        if col in text_columns:
+            column_values = [None if value is None else str(value) for value in column_values]
+        data[col] = column_values
+    return pd.DataFrame(data, columns=wanted)
+
+def read_csv_sample(filepath, nrows):
+    """Read the header and the first nrows rows of a CSV (all columns)"""
+    with open_source(filepath) as f:
+        return pd.read_csv(f, nrows=nrows)
+
+def read_csv_columns(filepath, columns=None, text_columns=(), chunk_rows=100000, on_progress=None):
+    """
+    Stream a CSV keeping only the given columns.
+
+    Text columns are read as strings without type inference. pyarrow's streaming reader
+    is used when available; files it can't parse in one schema (e.g. a column whose type
+    changes after the first block, or duplicate headers) fall back to chunked pandas.
+    on_progress(rows_read, bytes_consumed) is called after every block or chunk. Files
+    still being uploaded are parsed as their chunks arrive.
+    """
+    if pa_csv is not None and not os.path.exists(growing_marker(filepath)):
+        try:
+            return _read_csv_pyarrow(filepath, columns, text_columns, on_progress)
+        except (pa.ArrowInvalid, pa.ArrowKeyError, KeyError):
+            pass
+    return _read_csv_pandas(filepath, columns, text_columns, chunk_rows, on_progress)
+
+def _read_csv_pyarrow(filepath, columns, text_columns, on_progress):
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=list(columns) if columns is not None else None,
+        column_types={col: pa.string() for col in text_columns},
+        strings_can_be_null=True
+    )
+    with open(filepath, 'rb') as f:
+        reader = pa_csv.open_csv(
+            f,
+            read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            convert_options=convert_options
+        )
+        batches = []
+        rows_read = 0
+        for batch in reader:
+            batches.append(batch)
+            rows_read += batch.num_rows
+            if on_progress is not None:
+                on_progress(rows_read, f.tell())
+        return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+
+def _read_csv_pandas(filepath, columns, text_columns, chunk_rows, on_progress):
+    frames = []
+    rows_read = 0
+    with open_source(filepath) as f:
+        chunks = pd.read_csv(
+            f,
+            usecols=list(columns) if columns is not None else None,
+            dtype={col: str for col in text_columns},
+            chunksize=chunk_rows
+        )
+        for chunk in chunks:
+            frames.append(chunk)
+            rows_read += len(chunk)
+            if on_progress is not None:
+                on_progress(rows_read, f.tell())
+    if not frames:
+        return pd.read_csv(filepath, usecols=list(columns) if columns is not None else None)
+    df = pd.concat(frames, ignore_index=True)
+    # usecols doesn't preserve the requested order
+    return df[list(columns)] if columns is not None else df
@@ -0,0 +1,230 @@
+import json
+import re
+import time
+import threading
+from flask import current_app
+from llm_cache import category_set_hash
+from report_index import get_report_index
+
+# Seconds after which an unfinished insights run (e.g. from a restarted worker) is retried
+PENDING_TIMEOUT = 300
+
+_claim_lock = threading.Lock()
+
+def insights_key(session, model):
+    """Insights depend on the classification result, the category descriptions and the model"""
+    return f"{session.get('labels_hash')}:{category_set_hash(session.get('categories') or [])}:{model}"
+
+def request_insights(app, sessions, session_id):
+    """
+    Cached insights for the session's current classification.
+
+    Returns (insights, pending). When they are missing or stale a background run is
+    started and (None, True) is returned, so reports can render without waiting.
+    """
+    if not app.config.get('OPENAI_API_KEY'):
+        return None, False
+    
+    session = sessions[session_id]
+    entry = session.get('insights') or {}
+    if entry.get('key') == insights_key(session, app.config['INSIGHTS_MODEL']) and entry.get('status') == 'ready':
+        return entry['insights'], False
+    
+    start_insights(app, sessions, session_id)
+    return None, True
+
+def claim_insights(sessions, session_id, model):
+    """
+    Mark insights for the current classification as underway.
+    
+    Returns the classification key to compute them for, or None if they are ready or
+    already running.
+    """
+    with _claim_lock:
+        session = sessions.get(session_id)
+        if not session or session.get('labels') is None:
+            return None
+        
+        key = insights_key(session, model)
+        entry = session.get('insights') or {}
+        if entry.get('key') == key:
+            if entry.get('status') == 'ready':
+                return None
+            if entry.get('status') == 'pending' and time.time() - entry.get('started_at', 0) < PENDING_TIMEOUT:
+                return None
+        
+        sessions.patch(session_id, {'insights': {'key': key, 'status': 'pending', 'started_at': time.time()}})
+        return key
+
+def start_insights(app, sessions, session_id):
+    """Generate insights for the session in a background thread unless they're ready or running"""
+    if not app.config.get('OPENAI_API_KEY'):
+        return
+    key = claim_insights(sessions, session_id, app.config['INSIGHTS_MODEL'])
+    if key is None:
+        return
+    thread = threading.Thread(target=compute_insights, args=(app, sessions, session_id, key))
+    thread.daemon = True
+    thread.start()
+
+def compute_insights(app, sessions, session_id, key):
+    """Generate and store insights for the classification identified by key"""
+    with app.app_context():
+        try:
+            session = sessions[session_id]
+            insights = generate_insights_with_gpt4o(session, get_report_index(sessions, session_id))
+        except Exception as e:
+            current_app.logger.error(f"Insights generation failed for session {session_id}: {e}")
+            insights = None
+        
+        # Drop the result if the session was reclassified (or removed) meanwhile
+        session = sessions.get(session_id)
+        if session is None or insights_key(session, current_app.config['INSIGHTS_MODEL']) != key:
+            return
+        sessions.patch(session_id, {'insights': {
+            'key': key,
+            'status': 'ready' if insights else 'failed',
+            'insights': insights
+        }})
+        current_app.logger.info(f"Insights for session {session_id}: {'ready' if insights else 'failed'}")
+
+def generate_insights_with_gpt4o(session, index):
+    """Generate key insights and opportunities with the configured insights model (GPT-4o by default)"""
+    try:
+        if not current_app.config.get('OPENAI_API_KEY'):
+            return None
+        
+        from openai import OpenAI
+        client = OpenAI(api_key=current_app.config['OPENAI_API_KEY'])
+        
+        # Prepare data for analysis
+        categories = session['categories']
+        verbatim_col = session['verbatim_column']
+        
+        # Get category distribution
+        total_responses = index['total_rows']
+        
+        # Get sample quotes per category (more for analysis)
+        category_data = []
+        for cat in categories:
+            title = cat['title']
+            category_data.append({
+                'title': title,
+                'description': cat['description'],
+                'count': index['counts'].get(title, 0),
+                'percentage': index['percentages'].get(title, 0),
+                'samples': [text for _, text in index['samples'].get(title, [])[:25]]
+            })
+        
+        # Prepare analysis prompt
+        analysis_data = {
+            'total_responses': total_responses,
+            'categories': category_data,
+            'verbatim_column': verbatim_col
+        }
+        
+        system_prompt = """You are an expert customer experience analyst. Analyze survey data to provide actionable insights and opportunities.
+
+Your analysis should be:
+- Clear and actionable for business decision-makers
+- Focused on key issues and opportunities
+- Based on specific criticisms and feedback found in the sample comments
+- Written in plain business language
+- Cite specific themes and patterns from the actual comments provided
+
+CRITICAL: Respond ONLY with a valid JSON object. Do not include any markdown formatting, explanations, or text outside the JSON. The response must start with { and end with }.
+
+Provide your response as a JSON object with these sections:
+{
+  "key_insights": [
+    "4-6 bullet points highlighting specific patterns and themes from the comments"
+  ],
+  "priority_opportunities": [
+    "4-5 specific, actionable recommendations based on the feedback patterns"
+  ],
+  "sentiment_summary": "Brief overview of overall customer sentiment with specific observations",
+  "risk_areas": [
+    "3-4 areas that need immediate attention based on recurring complaints"
+  ]
+}
+
+Focus on specific criticisms, complaints, and suggestions found in the sample comments. Reference actual issues mentioned by customers."""
+
+        user_prompt = f"""Analyze this customer feedback data:
+
+SURVEY DETAILS:
+- Total responses: {analysis_data['total_responses']}
+- Feedback column: {analysis_data['verbatim_column']}
+
+CATEGORY BREAKDOWN:
+"""
+
+        for cat in category_data:
+            user_prompt += f"""
+{cat['title']} ({cat['count']} responses, {cat['percentage']:.1f}%):
+- Description: {cat['description']}
+- Sample comments: {cat['samples'][:25]}
+"""
+
+        user_prompt += """
+
+Analyze the sample comments thoroughly and provide insights focusing on:
+1. What specific pain points and criticisms are customers expressing?
+2. What patterns emerge across the feedback categories?
+3. Which operational issues appear most frequently in the comments?
+4. What specific improvements are customers requesting?
+5. Which problems should be prioritized based on frequency and severity of complaints?
+6. What positive feedback can guide future improvements?
+
+Pay close attention to recurring themes, specific service failures, and actionable suggestions within the actual customer comments provided."""
+
+        # Make the API call
+        response = client.chat.completions.create(
+            model=current_app.config['INSIGHTS_MODEL'],
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=1500,
+            temperature=0.3,
+            response_format={"type": "json_object"}
+        )
+        
+        # Parse the JSON response
+        insights_text = response.choices[0].message.content.strip()
+        
+        # Try to extract JSON from the response (handle markdown code blocks)
+        try:
+            # First, try direct JSON parsing
+            insights = json.loads(insights_text)
+            return insights
+        except json.JSONDecodeError:
+            # Try to extract JSON from markdown code blocks
+            json_match = re.search(r'```json\s*(.*?)\s*```', insights_text, re.DOTALL)
+            if json_match:
+                try:
+                    insights = json.loads(json_match.group(1))
+                    return insights
+                except json.JSONDecodeError:
+                    pass
+            
+            # Try to find JSON object in the text (look for { ... })
+            json_match = re.search(r'\{.*\}', insights_text, re.DOTALL)
+            if json_match:
+                try:
+                    insights = json.loads(json_match.group(0))
+                    return insights
+                except json.JSONDecodeError:
+                    pass
+            
+            current_app.logger.warning(f"Insights response was not valid JSON, using fallback. Response: {insights_text[:200]}...")
+            return {
+                "key_insights": ["Analysis completed but formatting issue occurred"],
+                "priority_opportunities": ["Review detailed category breakdown for specific areas to address"],
+                "sentiment_summary": "Mixed feedback with areas for improvement identified",
+                "risk_areas": ["Review individual categories for specific issues"]
+            }
+            
+    except Exception as e:
+        current_app.logger.error(f"Error generating insights: {e}")
+        return None
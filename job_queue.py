@@ -0,0 +1,305 @@
+import fcntl
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Job kinds and the functions that run them inside worker processes
+JOB_HANDLERS = {
+    'classify': 'routes.classify:run_classification_job'
+}
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+class JobQueue:
+    """
+    SQLite-backed job queue shared by the web workers and the local worker processes.
+
+    Payloads and results are pickled next to the database in the upload folder, so the
+    regular upload cleanup also removes them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.folder = os.path.dirname(path)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, '
+            'kind TEXT NOT NULL, '
+            'session_id TEXT, '
+            'priority INTEGER NOT NULL DEFAULT 0, '
+            'status TEXT NOT NULL, '
+            'progress TEXT, '
+            'error TEXT, '
+            'cancel_requested INTEGER NOT NULL DEFAULT 0, '
+            'worker_pid INTEGER, '
+            'created_at REAL NOT NULL, '
+            'started_at REAL, '
+            'finished_at REAL)'
+        )
+        return conn
+
+    def _file(self, job_id, name):
+        return os.path.join(self.folder, f"job_{job_id}_{name}.pkl")
+
+    def enqueue(self, kind, session_id, payload, priority=0):
+        """Queue a job and return its ID; higher priorities are claimed first"""
+        job_id = str(uuid.uuid4())
+        with open(self._file(job_id, 'payload'), 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, session_id, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, session_id, priority, 'queued', time.time())
+            )
+        finally:
+            conn.close()
+        return job_id
+
+    def claim(self, worker_pid):
+        """Atomically take the next queued job, or return None"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ? WHERE id = ?",
+                (worker_pid, time.time(), row['id'])
+            )
+            conn.execute('COMMIT')
+            return self.get(row['id'])
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_job(row) if row else None
+
+    def list(self, statuses=ACTIVE_STATUSES):
+        placeholders = ','.join('?' * len(statuses))
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f'SELECT * FROM jobs WHERE status IN ({placeholders}) ORDER BY priority DESC, created_at',
+                list(statuses)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [self._row_to_job(row) for row in rows]
+
+    def queue_position(self, job):
+        """Number of queued jobs that will be claimed before this one"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))",
+                (job['priority'], job['priority'], job['created_at'])
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0]
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', [*fields.values(), job_id])
+        finally:
+            conn.close()
+
+    def update_progress(self, job_id, progress):
+        self._update(job_id, progress=json.dumps(progress, default=str))
+
+    def complete(self, job_id, result):
+        with open(self._file(job_id, 'result'), 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._update(job_id, status='completed', finished_at=time.time())
+
+    def fail(self, job_id, error):
+        self._update(job_id, status='failed', error=str(error), finished_at=time.time())
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately, or flag a running one for its supervisor"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                (job_id,)
+            )
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def mark_cancelled(self, job_id):
+        self._update(job_id, status='cancelled', finished_at=time.time())
+
+    def load_payload(self, job_id):
+        with open(self._file(job_id, 'payload'), 'rb') as f:
+            return pickle.load(f)
+
+    def load_result(self, job_id):
+        with open(self._file(job_id, 'result'), 'rb') as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(row)
+        job['progress'] = json.loads(job['progress']) if job['progress'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+def worker_main(queue_path, config):
+    """Entry point of a worker process: claim and run jobs until terminated"""
+    from flask import Flask
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+    )
+    app = Flask('verbatim_worker')
+    app.config.from_mapping(config)
+    queue = JobQueue(queue_path)
+    pid = os.getpid()
+
+    while True:
+        job = queue.claim(pid)
+        if job is None:
+            time.sleep(0.5)
+            continue
+
+        module_name, function_name = JOB_HANDLERS[job['kind']].split(':')
+        handler = getattr(importlib.import_module(module_name), function_name)
+        with app.app_context():
+            try:
+                result = handler(queue, job, queue.load_payload(job['id']))
+                queue.complete(job['id'], result)
+                app.logger.info(f"Job {job['id']} ({job['kind']}) completed")
+            except Exception as e:
+                app.logger.exception(f"Job {job['id']} ({job['kind']}) failed")
+                queue.fail(job['id'], e)
+
+class WorkerPool:
+    """
+    Supervises a bounded set of local worker processes.
+
+    Only one pool runs per queue (guarded by a file lock), so several web workers on
+    the same box share the same concurrency limit. The supervisor respawns dead
+    workers, fails jobs whose worker died and terminates workers whose job was cancelled.
+    """
+
+    def __init__(self, queue, config, size):
+        self.queue = queue
+        self.config = config
+        self.size = size
+        self.processes = []
+        self._context = multiprocessing.get_context('spawn')
+        self._lock_file = None
+
+    def start(self):
+        """Start the pool unless another process already runs it; returns True if started"""
+        lock_file = open(f"{self.queue.path}.lock", 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+
+        # Jobs left running by a previous pool have lost their worker, unless it is still alive
+        for job in self.queue.list(('running',)):
+            if not pid_alive(job['worker_pid']):
+                self.queue.fail(job['id'], 'Worker process exited before the job finished')
+
+        for _ in range(self.size):
+            self._spawn()
+        supervisor = threading.Thread(target=self._supervise, daemon=True)
+        supervisor.start()
+        return True
+
+    def _spawn(self):
+        process = self._context.Process(target=worker_main, args=(self.queue.path, self.config), daemon=True)
+        process.start()
+        self.processes.append(process)
+        logger.info(f"Started job worker process {process.pid}")
+
+    def _supervise(self):
+        while True:
+            time.sleep(1)
+            try:
+                processes_by_pid = {process.pid: process for process in self.processes}
+                for job in self.queue.list(('running',)):
+                    process = processes_by_pid.get(job['worker_pid'])
+                    if job['cancel_requested'] and process is not None and process.is_alive():
+                        process.terminate()
+                        process.join(5)
+                        self.queue.mark_cancelled(job['id'])
+                        logger.info(f"Cancelled job {job['id']}")
+                    elif (process is None and not pid_alive(job['worker_pid'])) or (process is not None and not process.is_alive()):
+                        self.queue.fail(job['id'], 'Worker process exited before the job finished')
+
+                alive = [process for process in self.processes if process.is_alive()]
+                self.processes = alive
+                for _ in range(self.size - len(alive)):
+                    self._spawn()
+            except Exception as e:
+                logger.error(f"Job supervisor error: {e}")
+
+def pid_alive(pid):
+    """Whether a process with this ID still exists"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+_queue = None
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_job_queue(app):
+    """Return the job queue for this app, starting the local worker pool on first use"""
+    global _queue, _pool
+    with _pool_lock:
+        if _queue is None:
+            _queue = JobQueue(app.config['JOB_QUEUE_PATH'])
+        if _pool is None:
+            config = {key: value for key, value in app.config.items() if key.isupper()}
+            pool = WorkerPool(_queue, config, app.config.get('JOB_WORKERS', 2))
+            if pool.start():
+                _pool = pool
+        return _queue
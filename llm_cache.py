@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from flask import current_app
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_MAX_PARAMS = 900
+
+def normalize_comment_text(text):
+    """Normalize a comment for cache lookups (collapse whitespace, ignore case)"""
+    return ' '.join(str(text).split()).casefold()
+
+def category_set_hash(categories):
+    """Stable hash of the category titles and descriptions"""
+    pairs = sorted(
+        (str(cat.get('title', '')), str(cat.get('description', '')))
+        for cat in categories
+    )
+    return hashlib.sha256(json.dumps(pairs, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class ClassificationCache:
+    """Disk-backed cache of LLM classifications keyed on (comment, category set, model)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS classifications ('
+                'key TEXT PRIMARY KEY, '
+                'category TEXT NOT NULL, '
+                'created_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(comment, category_hash, model):
+        raw = '\x1f'.join([normalize_comment_text(comment), category_hash, model])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_many(self, comments, category_hash, model):
+        """Look up cached categories, returning {comment: category} for hits"""
+        keys = {}
+        for comment in comments:
+            keys.setdefault(self.make_key(comment, category_hash, model), []).append(comment)
+
+        hits = {}
+        key_list = list(keys)
+        with self._connect() as conn:
+            for i in range(0, len(key_list), SQLITE_MAX_PARAMS):
+                chunk = key_list[i:i + SQLITE_MAX_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, category FROM classifications WHERE key IN ({placeholders})',
+                    chunk
+                ).fetchall()
+                for key, category in rows:
+                    for comment in keys[key]:
+                        hits[comment] = category
+        return hits
+
+    def set_many(self, items, category_hash, model):
+        """Store (comment, category) pairs"""
+        now = time.time()
+        rows = [
+            (self.make_key(comment, category_hash, model), category, now)
+            for comment, category in items
+        ]
+        if not rows:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO classifications (key, category, created_at) VALUES (?, ?, ?)',
+                rows
+            )
+
+class EmbeddingCache:
+    """Disk-backed cache of embedding vectors keyed on (text, model)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                'key TEXT PRIMARY KEY, '
+                'vector BLOB NOT NULL, '
+                'created_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(text, model):
+        return hashlib.sha256(f"{model}\x1f{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts, model):
+        """Look up cached embeddings, returning {text: float32 vector} for hits"""
+        keys = {self.make_key(text, model): text for text in texts}
+        hits = {}
+        key_list = list(keys)
+        with self._connect() as conn:
+            for i in range(0, len(key_list), SQLITE_MAX_PARAMS):
+                chunk = key_list[i:i + SQLITE_MAX_PARAMS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})',
+                    chunk
+                ).fetchall()
+                for key, vector in rows:
+                    hits[keys[key]] = np.frombuffer(vector, dtype=np.float32)
+        return hits
+
+    def set_many(self, items, model):
+        """Store (text, vector) pairs"""
+        now = time.time()
+        rows = [
+            (self.make_key(text, model), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in items
+        ]
+        if not rows:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)',
+                rows
+            )
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def _get_cache(config_key, cache_class):
+    path = current_app.config.get(config_key)
+    if not path:
+        return None
+    with _caches_lock:
+        cache = _caches.get(config_key)
+        if cache is None or cache.path != path:
+            cache = _caches[config_key] = cache_class(path)
+        return cache
+
+def get_classification_cache():
+    """Return the process-wide classification cache, or None if disabled"""
+    return _get_cache('CLASSIFICATION_CACHE_PATH', ClassificationCache)
+
+def get_embedding_cache():
+    """Return the process-wide embedding cache, or None if disabled"""
+    return _get_cache('EMBEDDING_CACHE_PATH', EmbeddingCache)
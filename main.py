@@ -2,11 +2,14 @@ from flask import Flask, render_template
 import os
 import logging
 from config import Config
-from routes.upload import upload_bp
+from routes.upload import upload_bp, upload_sessions, classification_progress, upload_progress
 from routes.suggest import suggest_bp
 from routes.classify import classify_bp
 from routes.summary import summary_bp
 from routes.download import download_bp
+from routes.jobs import jobs_bp
+from routes.chunked_upload import chunked_upload_bp, chunked_uploads
+from warmup import start_warmup
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
 import glob
@@ -34,10 +37,16 @@ app.register_blueprint(suggest_bp)
 app.register_blueprint(classify_bp)
 app.register_blueprint(summary_bp)
 app.register_blueprint(download_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(chunked_upload_bp)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    max_upload_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    max_chunked_upload_mb = app.config['MAX_CHUNKED_UPLOAD_BYTES'] // (1024 * 1024)
+    return render_template('index.html', max_upload_mb=max_upload_mb,
+                           max_chunked_upload_mb=max_chunked_upload_mb,
+                           chunk_size=app.config['UPLOAD_CHUNK_SIZE'])
 
 @app.route('/favicon.ico')
 def favicon():
@@ -53,7 +62,13 @@ def cleanup_old_files():
         current_time = time.time()
         cleanup_age = 24 * 60 * 60  # 24 hours in seconds (1 day)
         
+        # The job queue and shared session databases (with their lock, WAL and journal files)
+        # stay in use however old they are
+        keep_prefixes = (app.config['JOB_QUEUE_PATH'], app.config['SESSION_DB_PATH'])
+        
         for filepath in glob.glob(os.path.join(upload_folder, "*")):
+            if filepath.startswith(keep_prefixes):
+                continue
             if os.path.isfile(filepath):
                 file_age = current_time - os.path.getmtime(filepath)
                 if file_age > cleanup_age:
@@ -62,6 +77,26 @@ def cleanup_old_files():
                         app.logger.info(f"Cleaned up old file: {filepath}")
                     except Exception as e:
                         app.logger.error(f"Failed to cleanup {filepath}: {e}")
+        
+        # Drop sessions whose uploaded data has been cleaned up
+        with app.app_context():
+            for session_id in list(upload_sessions):
+                session = upload_sessions.get(session_id)
+                if session and session.get('data_path') and not os.path.exists(session['data_path']):
+                    del upload_sessions[session_id]
+                    if session_id in classification_progress:
+                        del classification_progress[session_id]
+                    app.logger.info(f"Expired session {session_id}")
+            
+            # Parse status of old uploads (including failed ones that never became sessions)
+            for session_id in list(upload_progress):
+                progress = upload_progress.get(session_id)
+                if progress and current_time - progress.get('start_time', current_time) > cleanup_age:
+                    del upload_progress[session_id]
+            for upload_id in list(chunked_uploads):
+                upload = chunked_uploads.get(upload_id)
+                if upload and current_time - upload.get('created_at', current_time) > cleanup_age:
+                    del chunked_uploads[upload_id]
     except Exception as e:
         app.logger.error(f"Cleanup job failed: {e}")
 
@@ -73,4 +108,5 @@ if not app.debug:
     atexit.register(lambda: scheduler.shutdown())
 
 if __name__ == '__main__':
+    start_warmup(app)
     app.run(debug=True, port=os.getenv("PORT", default=5000))
@@ -0,0 +1,67 @@
+import threading
+
+class ProgressBroker:
+    """
+    In-process publish/subscribe of progress snapshots.
+
+    Every publish stores the latest snapshot for a key under a new, increasing event
+    ID and wakes the subscribers waiting on that key. Subscribers only need the latest
+    state, so a reconnecting client that passes its last event ID gets the current
+    snapshot if anything changed since, without replaying intermediate events.
+    """
+
+    def __init__(self):
+        self._last_id = 0
+        self._latest = {}
+        self._conditions = {}
+        self._lock = threading.Lock()
+
+    def _condition(self, key):
+        with self._lock:
+            condition = self._conditions.get(key)
+            if condition is None:
+                condition = self._conditions[key] = threading.Condition()
+            return condition
+
+    def publish(self, key, snapshot):
+        """Record a new snapshot for key and wake its subscribers; returns the event ID"""
+        condition = self._condition(key)
+        with condition:
+            with self._lock:
+                self._last_id += 1
+                event_id = self._last_id
+            self._latest[key] = (event_id, snapshot)
+            condition.notify_all()
+        return event_id
+
+    def discard(self, key):
+        """Forget a key; waiting subscribers wake up and see it is gone"""
+        condition = self._condition(key)
+        with condition:
+            self._latest.pop(key, None)
+            condition.notify_all()
+        with self._lock:
+            self._conditions.pop(key, None)
+
+    def latest(self, key):
+        """(event ID, snapshot) of the last publish for key, or None"""
+        return self._latest.get(key)
+
+    def wait(self, key, last_event_id=0, timeout=None):
+        """
+        Block until key has an event newer than last_event_id.
+
+        Returns (event ID, snapshot), or None on timeout or if the key is discarded. An ID
+        never issued here (from another process or before a restart) counts as stale.
+        """
+        condition = self._condition(key)
+        with condition:
+            def ready():
+                latest = self._latest.get(key)
+                if latest is None:
+                    return key not in self._conditions
+                return latest[0] > last_event_id or last_event_id > self._last_id
+
+            if not condition.wait_for(ready, timeout):
+                return None
+            return self._latest.get(key)
@@ -0,0 +1,99 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+class ProgressTracker:
+    """
+    Thread-safe completion counter for a classification run.
+
+    Work is counted when it finishes, so progress only moves forward no matter how
+    many batches run concurrently. The processing rate is an exponential moving
+    average of completions weighted by the time between them (time_constant seconds),
+    so bursts of batches finishing together don't swing it. Named phases (LLM calls,
+    semantic re-checks, finalization, ...) accumulate their timings.
+    """
+
+    def __init__(self, total, start_time=None, time_constant=10.0):
+        self.total = total
+        self.processed = 0
+        self.start_time = start_time or time.time()
+        self.time_constant = time_constant
+        self.rate = None
+        self._last_update = time.monotonic()
+        self._started = self._last_update
+        self.row_weights = {}
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    def count_rows(self, indices):
+        """Rows covered by the given comment indices (a deduplicated comment stands for its whole group)"""
+        return sum(self.row_weights.get(idx, 1) for idx in indices)
+
+    def skip(self, count):
+        """Count rows resolved without work (duplicates, cache hits, ...) without affecting the rate"""
+        with self._lock:
+            self.processed = min(self.total, self.processed + count)
+
+    def advance(self, count):
+        """Record count finished rows and update the smoothed rate"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_update
+            self._last_update = now
+            self.processed = min(self.total, self.processed + count)
+            if self.rate is None:
+                # First completion: average since the tracker started
+                self.rate = count / max(now - self._started, 1e-3)
+            elif elapsed > 0:
+                weight = 1 - math.exp(-elapsed / self.time_constant)
+                self.rate = weight * (count / elapsed) + (1 - weight) * self.rate
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block as part of a named phase"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(name, started, time.monotonic())
+
+    def record_phase(self, name, started, finished):
+        with self._lock:
+            phase = self._phases.setdefault(name, {'first_start': started, 'last_end': finished, 'busy': 0.0, 'calls': 0})
+            phase['first_start'] = min(phase['first_start'], started)
+            phase['last_end'] = max(phase['last_end'], finished)
+            phase['busy'] += finished - started
+            phase['calls'] += 1
+
+    def phase_timings(self):
+        """
+        Per-phase timings: wall-clock seconds from first start to last end, busy seconds
+        summed over (possibly concurrent) calls, and the number of calls.
+        """
+        with self._lock:
+            return {
+                name: {
+                    'seconds': round(phase['last_end'] - phase['first_start'], 3),
+                    'busy_seconds': round(phase['busy'], 3),
+                    'calls': phase['calls']
+                }
+                for name, phase in self._phases.items()
+            }
+
+    def snapshot(self):
+        """Progress fields for the classification progress store"""
+        with self._lock:
+            processed = self.processed
+            rate = self.rate
+        remaining = self.total - processed
+        elapsed = time.time() - self.start_time
+        return {
+            'processed': processed,
+            'remaining': remaining,
+            'processing_rate': round(rate, 2) if rate else 0,
+            'average_rate': round(processed / elapsed, 2) if elapsed > 0 else 0,
+            'estimated_time_remaining': round(remaining / rate) if rate else None,
+            'phase_timings': self.phase_timings(),
+            'heartbeat_at': time.time()
+        }
@@ -0,0 +1,209 @@
+import asyncio
+import random
+import re
+import time
+
+# Matches OpenAI reset durations such as "1s", "20ms", "6m0s" or "1h2m3.5s"
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+def parse_reset_duration(value):
+    """Parse a rate-limit reset header value into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+# Limits reported by response headers, per model, so later runs start from the account's
+# real limits instead of configured guesses
+_observed_limits = {}
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is still rate limited (or failing) after all retries"""
+
+class _Budget:
+    """Token bucket refilled continuously over one minute; unlimited until a limit is known"""
+
+    def __init__(self, per_minute=None):
+        self.capacity = float(per_minute) if per_minute else None
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount):
+        if self.capacity is None:
+            return 0
+        # A single request larger than the whole budget only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0
+        return (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount):
+        if self.capacity is not None:
+            self.level -= min(amount, self.capacity)
+
+    def observe(self, limit, remaining):
+        """Align the bucket with the limits reported by the server"""
+        if limit:
+            if self.capacity is None:
+                self.level = float(limit)
+            self.capacity = float(limit)
+        if remaining is not None and self.capacity is not None:
+            self.level = min(self.level, float(remaining))
+
+class RateLimitScheduler:
+    """
+    Schedules OpenAI requests within requests-per-minute and tokens-per-minute budgets.
+
+    Concurrency adapts to throttling: it is halved on every 429 and grows back by one
+    after a run of successful requests (failed requests don't count). The budgets start
+    from the limits last reported by the server for this key (usually the model), else
+    from the configured ones, else unlimited until the first response headers arrive.
+    429/5xx/connection errors are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=10,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, key=None):
+        self.key = key
+        observed_requests, observed_tokens = _observed_limits.get(key, (None, None))
+        self.requests = _Budget(observed_requests or requests_per_minute)
+        self.tokens = _Budget(observed_tokens or tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.throttle_events = 0
+        self.retries = 0
+        self._successes = 0
+        self._lock = asyncio.Lock()
+        self._slot_available = asyncio.Condition(self._lock)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            requests_per_minute=config.get('OPENAI_RPM_LIMIT'),
+            tokens_per_minute=config.get('OPENAI_TPM_LIMIT'),
+            max_concurrency=config.get('LLM_MAX_CONCURRENCY', 10),
+            max_retries=config.get('LLM_MAX_RETRIES', 5),
+            key=config.get('CLASSIFICATION_MODEL')
+        )
+
+    def stats(self):
+        return {
+            'concurrency': self.in_flight,
+            'concurrency_limit': self.concurrency_limit,
+            'throttle_events': self.throttle_events,
+            'retries': self.retries
+        }
+
+    async def run(self, make_request, estimated_tokens):
+        """
+        Run make_request() within the budgets, retrying transient failures.
+
+        make_request must return a raw response (from ``with_raw_response``) so rate-limit
+        headers can be read; the parsed response is returned.
+        """
+        # The SDK is loaded on first use rather than at startup
+        import openai
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(estimated_tokens)
+            try:
+                raw_response = await make_request()
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+                await self._release(throttled=isinstance(e, openai.RateLimitError), succeeded=False)
+                if attempt == self.max_retries:
+                    raise RateLimitExceeded(f"Request failed after {self.max_retries} retries: {e}") from e
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt, getattr(e, 'response', None)))
+                continue
+            except Exception:
+                await self._release(succeeded=False)
+                raise
+
+            self._observe_headers(raw_response.headers)
+            await self._release()
+            return raw_response.parse()
+
+    async def _acquire(self, estimated_tokens):
+        async with self._slot_available:
+            while True:
+                if self.in_flight < self.concurrency_limit:
+                    self.requests.refill()
+                    self.tokens.refill()
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                    if wait == 0:
+                        self.requests.take(1)
+                        self.tokens.take(estimated_tokens)
+                        self.in_flight += 1
+                        return
+                    timeout = wait
+                else:
+                    timeout = None
+                try:
+                    await asyncio.wait_for(self._slot_available.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self, throttled=False, succeeded=True):
+        async with self._slot_available:
+            self.in_flight -= 1
+            if throttled:
+                self.throttle_events += 1
+                self._successes = 0
+                self.concurrency_limit = max(1, self.concurrency_limit // 2)
+            elif not succeeded:
+                # Server errors and dropped connections don't earn more concurrency
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.concurrency_limit and self.concurrency_limit < self.max_concurrency:
+                    self.concurrency_limit += 1
+                    self._successes = 0
+            self._slot_available.notify_all()
+
+    def _observe_headers(self, headers):
+        def header_int(name):
+            try:
+                return int(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        self.requests.observe(header_int('x-ratelimit-limit-requests'), header_int('x-ratelimit-remaining-requests'))
+        self.tokens.observe(header_int('x-ratelimit-limit-tokens'), header_int('x-ratelimit-remaining-tokens'))
+        if self.requests.capacity or self.tokens.capacity:
+            _observed_limits[self.key] = (self.requests.capacity, self.tokens.capacity)
+
+    def _backoff(self, attempt, response):
+        # Honour the server's hint when it gives one
+        if response is not None:
+            headers = response.headers
+            retry_after_ms = headers.get('retry-after-ms')
+            retry_after = headers.get('retry-after')
+            reset = parse_reset_duration(headers.get('x-ratelimit-reset-requests')) or \
+                parse_reset_duration(headers.get('x-ratelimit-reset-tokens'))
+            try:
+                if retry_after_ms:
+                    return min(self.max_delay, float(retry_after_ms) / 1000) + random.uniform(0, 0.5)
+                if retry_after:
+                    return min(self.max_delay, float(retry_after)) + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+            if reset:
+                return min(self.max_delay, reset) + random.uniform(0, 0.5)
+
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
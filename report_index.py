@@ -0,0 +1,68 @@
+import hashlib
+import pandas as pd
+from frame_storage import session_frame
+
+# Sample quotes kept per category (the insights prompt uses the most)
+SAMPLE_QUOTES = 25
+
+def labels_hash(labels):
+    """Fingerprint of a classification result (row index and label of every row)"""
+    hashed = pd.util.hash_pandas_object(labels, index=True).values
+    return hashlib.sha256(hashed.tobytes()).hexdigest()
+
+def build_report_index(labels, comments, sample_count=SAMPLE_QUOTES):
+    """
+    Group classified rows by category in one pass.
+
+    Returns counts and percentages per category, the row positions of each category and
+    the first sample_count non-empty comments of each as (row index, text) pairs, so the
+    summary, report and status endpoints don't rescan the frame on every request.
+    """
+    total_rows = len(labels)
+    comments = comments.reindex(labels.index)
+    non_empty = (comments.notna() & (comments.astype(str).str.len() > 0)).to_numpy()
+    row_index = labels.index
+
+    positions = labels.groupby(labels, sort=False).indices
+    counts = {title: len(rows) for title, rows in positions.items()}
+
+    samples = {}
+    for title, rows in positions.items():
+        chosen = rows[non_empty[rows]][:sample_count]
+        samples[title] = [(row_index[position], str(comments.iat[position])) for position in chosen]
+
+    return {
+        'total_rows': total_rows,
+        'counts': counts,
+        'percentages': {title: count / total_rows * 100 for title, count in counts.items()},
+        'positions': positions,
+        'samples': samples,
+        'labels_hash': labels_hash(labels)
+    }
+
+def classification_fields(labels, comments=None):
+    """
+    Session fields to write with new labels.
+
+    The report index is built right away when the comments are at hand, otherwise on
+    first use by get_report_index.
+    """
+    return {
+        'labels': labels,
+        'labels_hash': labels_hash(labels),
+        'report_index': build_report_index(labels, comments) if comments is not None else None
+    }
+
+def get_report_index(sessions, session_id):
+    """The session's report index, rebuilt only after its labels or categories changed"""
+    session = sessions[session_id]
+    labels = session.get('labels')
+    if labels is None:
+        return None
+
+    index = session.get('report_index')
+    if index is None or index['labels_hash'] != session.get('labels_hash'):
+        verbatim_col = session['verbatim_column']
+        index = build_report_index(labels, session_frame(session, [verbatim_col])[verbatim_col])
+        sessions.patch(session_id, {'report_index': index, 'labels_hash': index['labels_hash']})
+    return index
@@ -0,0 +1,253 @@
+from flask import Blueprint, request, jsonify, current_app
+import os
+import uuid
+import time
+import fcntl
+import hashlib
+import threading
+from werkzeug.utils import secure_filename
+from utils import allowed_file
+from ingest import mark_growing, finish_growing
+from session_store import Store
+from routes.upload import upload_progress, parse_upload_async
+
+chunked_upload_bp = Blueprint('chunked_upload', __name__)
+
+# Chunked uploads in progress (the upload ID becomes the session ID)
+chunked_uploads = Store('chunked_uploads')
+
+@chunked_upload_bp.route('/uploads', methods=['POST'])
+def init_chunked_upload():
+    """Start a chunked upload; the file is then sent with PUT /uploads/<id>?offset=N"""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = secure_filename(data.get('filename') or '')
+        size = data.get('size')
+        
+        if not filename:
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not allowed_file(filename):
+            return jsonify({'error': 'File type not supported. Please upload .xlsx, .xls, or .csv files'}), 400
+        
+        if not isinstance(size, int) or size <= 0:
+            return jsonify({'error': 'File size required'}), 400
+        
+        max_size = current_app.config['MAX_CHUNKED_UPLOAD_BYTES']
+        if size > max_size:
+            return jsonify({'error': f'File size must be less than {max_size // (1024 * 1024)}MB'}), 413
+        
+        passthrough = data.get('passthrough_columns') or []
+        sheet = data.get('sheet') or None
+        
+        upload_id = str(uuid.uuid4())
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{upload_id}_{filename}")
+        open(filepath, 'wb').close()
+        
+        chunked_uploads[upload_id] = {
+            'filename': filename,
+            'filepath': filepath,
+            'size': size,
+            'sheet': sheet,
+            'passthrough': passthrough,
+            'status': 'uploading',
+            'created_at': time.time()
+        }
+        upload_progress[upload_id] = {
+            'status': 'uploading',
+            'filename': filename,
+            'rows_read': 0,
+            'bytes_consumed': 0,
+            'bytes_received': 0,
+            'bytes_total': size,
+            'current_step': 'Uploading...',
+            'start_time': time.time()
+        }
+        
+        # CSVs are parsed while their chunks arrive; workbooks need the whole file
+        if filename.endswith('.csv'):
+            mark_growing(filepath)
+            start_parsing(upload_id)
+        
+        return jsonify({
+            'upload_id': upload_id,
+            'session_id': upload_id,
+            'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+            'received': 0,
+            'size': size
+        }), 201
+    
+    except Exception as e:
+        current_app.logger.error(f"Chunked upload init error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@chunked_upload_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """How much of the file has been received, so an interrupted upload can resume"""
+    try:
+        if upload_id not in chunked_uploads:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        upload = chunked_uploads[upload_id]
+        received = os.path.getsize(upload['filepath']) if os.path.exists(upload['filepath']) else 0
+        
+        return jsonify({
+            'upload_id': upload_id,
+            'status': upload['status'],
+            'received': received,
+            'size': upload['size']
+        }), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Chunked upload status error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@chunked_upload_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def put_chunk(upload_id):
+    """
+    Write one chunk at ?offset=N.
+    
+    Chunks must continue from the bytes already received; an optional X-Chunk-SHA256
+    header is checked before anything is written. Re-sending a chunk that already
+    arrived is harmless.
+    """
+    try:
+        if upload_id not in chunked_uploads:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        upload = chunked_uploads[upload_id]
+        if upload['status'] != 'uploading':
+            return jsonify({'error': f"Upload is {upload['status']}"}), 409
+        
+        # Parsing the chunks received so far may already have failed
+        progress = upload_progress.get(upload_id)
+        if progress and progress.get('status') == 'failed':
+            return jsonify({'error': progress.get('error', 'Upload failed')}), 409
+        
+        offset = request.args.get('offset', type=int)
+        if offset is None or offset < 0:
+            return jsonify({'error': 'Chunk offset required'}), 400
+        
+        chunk = request.get_data()
+        checksum = request.headers.get('X-Chunk-SHA256')
+        if checksum and hashlib.sha256(chunk).hexdigest() != checksum.strip().lower():
+            return jsonify({'error': 'Chunk checksum mismatch'}), 400
+        
+        if offset + len(chunk) > upload['size']:
+            return jsonify({'error': 'Chunk extends past the declared file size'}), 400
+        
+        # The partial file may have been swept by cleanup since the last chunk
+        try:
+            f = open(upload['filepath'], 'r+b')
+        except FileNotFoundError:
+            return jsonify({'error': 'Upload data is no longer available; start the upload again'}), 410
+        
+        with f:
+            # Serialize writers so retried chunks can't interleave
+            fcntl.flock(f, fcntl.LOCK_EX)
+            received = os.fstat(f.fileno()).st_size
+            if offset > received:
+                return jsonify({'error': 'Chunk is past the end of the received data', 'received': received}), 409
+            
+            # Only append the part not received yet
+            if offset + len(chunk) > received:
+                f.seek(received)
+                f.write(chunk[received - offset:])
+                f.flush()
+                received = offset + len(chunk)
+            
+            # Still holding the lock, so only one of several resumed chunks restarts the parse
+            resume_stalled_parse(upload_id)
+        
+        upload_progress.patch(upload_id, {'bytes_received': received})
+        
+        return jsonify({'upload_id': upload_id, 'received': received, 'size': upload['size']}), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Chunk upload error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@chunked_upload_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Finish a chunked upload (optionally checking the whole file's sha256) and parse it"""
+    try:
+        if upload_id not in chunked_uploads:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        upload = chunked_uploads[upload_id]
+        if upload['status'] != 'uploading':
+            return jsonify({'error': f"Upload is {upload['status']}"}), 409
+        
+        # Parsing the chunks received so far may already have failed
+        progress = upload_progress.get(upload_id)
+        if progress and progress.get('status') == 'failed':
+            return jsonify({'error': progress.get('error', 'Upload failed')}), 409
+        
+        filepath = upload['filepath']
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'Upload data is no longer available; start the upload again'}), 410
+        
+        received = os.path.getsize(filepath)
+        if received != upload['size']:
+            return jsonify({'error': 'Upload is incomplete', 'received': received, 'size': upload['size']}), 409
+        
+        data = request.get_json(silent=True) or {}
+        if data.get('sha256') and file_sha256(filepath) != data['sha256'].strip().lower():
+            fail_chunked_upload(upload_id, 'File checksum mismatch')
+            return jsonify({'error': 'File checksum mismatch'}), 400
+        
+        resume_stalled_parse(upload_id)
+        chunked_uploads.patch(upload_id, {'status': 'completed'})
+        upload_progress.patch(upload_id, {'status': 'parsing', 'current_step': 'Processing file...'})
+        if filepath.endswith('.csv'):
+            finish_growing(filepath)
+        else:
+            start_parsing(upload_id)
+        
+        return jsonify({
+            'session_id': upload_id,
+            'filename': upload['filename'],
+            'status': 'parsing'
+        }), 202
+    
+    except Exception as e:
+        current_app.logger.error(f"Chunked upload complete error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+def start_parsing(upload_id):
+    """Parse an upload in the background (for CSVs, while its chunks are still arriving)"""
+    upload = chunked_uploads[upload_id]
+    thread = threading.Thread(
+        target=parse_upload_async,
+        args=(current_app._get_current_object(), upload_id, upload['filepath'], upload['filename'],
+              upload['sheet'], upload['passthrough'])
+    )
+    thread.daemon = True
+    thread.start()
+
+def resume_stalled_parse(upload_id):
+    """Restart the parse of a CSV that gave up waiting for chunks, from the start of the file"""
+    progress = upload_progress.get(upload_id)
+    if not progress or progress.get('status') != 'stalled':
+        return
+    upload_progress.patch(upload_id, {
+        'status': 'uploading',
+        'rows_read': 0,
+        'bytes_consumed': 0,
+        'current_step': 'Uploading...'
+    })
+    start_parsing(upload_id)
+
+def fail_chunked_upload(upload_id, message):
+    """Abort an upload, stopping a parse that is following the file"""
+    upload = chunked_uploads.patch(upload_id, {'status': 'failed'})
+    if os.path.exists(upload['filepath']):
+        finish_growing(upload['filepath'], failed=True)
+    upload_progress.patch(upload_id, {'status': 'failed', 'current_step': message, 'error': message})
+
+def file_sha256(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
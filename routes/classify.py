@@ -1,15 +1,32 @@
 from flask import Blueprint, request, jsonify, current_app, Response
-from openai import AsyncOpenAI
 import pandas as pd
 import time
 import json
 import threading
 import asyncio
+import os
+import socket
 import numpy as np
-from routes.upload import upload_sessions, classification_progress
+from routes.upload import upload_sessions, classification_progress, progress_events
+from llm_cache import get_classification_cache, get_embedding_cache, category_set_hash
+from dedup import collapse_duplicates, expand_classifications
+from rate_limiter import RateLimitScheduler, RateLimitExceeded
+from classification_journal import ClassificationJournal, journal_path, discard_journal
+from job_queue import get_job_queue, pid_alive
+from frame_storage import session_frame, load_frame, CATEGORY_COLUMN
+from progress_tracker import ProgressTracker
+from report_index import classification_fields, get_report_index
+from insights import start_insights
 
 classify_bp = Blueprint('classify', __name__)
 
+# Maximum number of inputs per embeddings request
+EMBEDDING_BATCH_SIZE = 2048
+
+# 'llm' classifies every comment with the chat model; 'embedding' assigns comments to the
+# nearest category embedding and only sends ambiguous ones to the chat model
+CLASSIFICATION_MODES = ('llm', 'embedding')
+
 @classify_bp.route('/sessions/<session_id>/classify', methods=['POST'])
 def classify_comments(session_id):
     """Start classification process asynchronously"""
@@ -26,42 +43,89 @@ def classify_comments(session_id):
         if not session.get('categories'):
             return jsonify({'error': 'Categories not defined. Please generate categories first.'}), 400
         
-        df = session.get('dataframe')
         verbatim_col = session.get('verbatim_column')
         categories = session.get('categories')
         
-        if df is None:
+        if not session.get('data_path'):
             return jsonify({'error': 'File data not found. Please upload a file first.'}), 400
         
-        if not verbatim_col or verbatim_col not in df.columns:
+        if not verbatim_col or verbatim_col not in session['columns']:
             return jsonify({'error': 'Verbatim column not set or invalid'}), 400
         
+        # Optional per-request override of the configured classification mode
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode') or current_app.config.get('CLASSIFICATION_MODE', 'llm')
+        if mode not in CLASSIFICATION_MODES:
+            return jsonify({'error': f"Unknown classification mode '{mode}'"}), 400
+        
         # Check if classification is already in progress
+        sync_classification_job(session_id)
         if session_id in classification_progress:
             current_progress = classification_progress[session_id]
             if current_progress.get('status') == 'processing':
-                return jsonify({'error': 'Classification already in progress'}), 409
+                if not classification_abandoned(current_progress):
+                    return jsonify({'error': 'Classification already in progress'}), 409
+                current_app.logger.warning(f"Classification for session {session_id} was abandoned by worker {current_progress['owner']}, restarting")
+        
+        # Runs resume from the last checkpoint unless the client asks for a fresh start
+        if data.get('resume', True) is False:
+            discard_journal(current_app.config['UPLOAD_FOLDER'], session_id)
         
         # Initialize progress tracking
+        total_rows = session['total_rows']
         classification_progress[session_id] = {
             'status': 'processing',
             'progress': 0,
-            'total': len(df),
+            'total': total_rows,
             'processed': 0,
-            'remaining': len(df),
+            'remaining': total_rows,
             'current_step': 'Starting classification...',
             'completed': False,
             'start_time': time.time(),
             'estimated_time_remaining': None,
-            'processing_rate': 0
+            'processing_rate': 0,
+            'mode': mode
         }
-        current_app.logger.info(f"Initialized progress tracking for session {session_id}, total rows: {len(df)}")
+        current_app.logger.info(f"Initialized progress tracking for session {session_id}, total rows: {total_rows}")
+        
+        if current_app.config.get('JOB_BACKEND') == 'process':
+            # Hand the run to the local worker processes; this worker only reports status
+            queue = get_job_queue(current_app._get_current_object())
+            job_id = queue.enqueue('classify', session_id, {
+                'data_path': session['data_path'],
+                'verbatim_column': verbatim_col,
+                'categories': categories,
+                'mode': mode,
+                'progress': classification_progress[session_id]
+            }, priority=int(data.get('priority', 0)))
+            upload_sessions.patch(session_id, {'classification_job_id': job_id})
+            classification_progress.patch(session_id, {
+                'job_id': job_id,
+                'current_step': 'Queued for classification...'
+            })
+            current_app.logger.info(f"Queued classification job {job_id} for session {session_id}")
+            
+            return jsonify({
+                'session_id': session_id,
+                'job_id': job_id,
+                'status': 'processing',
+                'message': 'Classification queued'
+            }), 202
+        
+        # Record which worker runs it, so a run left behind by a dead worker can be restarted
+        classification_progress.patch(session_id, {
+            'owner': {'host': socket.gethostname(), 'pid': os.getpid()},
+            'heartbeat_at': time.time()
+        })
+        
+        # Only the verbatim column is needed to classify
+        df = session_frame(session, [verbatim_col])
         
         # Start classification in background thread with app context
         current_app.logger.info(f"Starting background thread for session {session_id}")
         thread = threading.Thread(
             target=perform_classification_async,
-            args=(current_app._get_current_object(), df, verbatim_col, categories, session_id)
+            args=(current_app._get_current_object(), df, verbatim_col, categories, session_id, mode)
         )
         thread.daemon = True
         thread.start()
@@ -90,27 +154,67 @@ def classify_comments(session_id):
 
 @classify_bp.route('/sessions/<session_id>/progress', methods=['GET'])
 def progress_stream(session_id):
-    """Server-sent events endpoint for real-time progress updates"""
+    """
+    Server-sent events endpoint for real-time progress updates.
+    
+    A frame is sent whenever the progress changes, each with an event ID so reconnecting
+    clients resume from Last-Event-ID; heartbeat comments keep idle streams open.
+    """
+    app = current_app._get_current_object()
+    heartbeat = app.config.get('PROGRESS_HEARTBEAT_SECONDS', 15)
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+    
     def generate():
-        if session_id not in upload_sessions:
-            yield f"data: {json.dumps({'error': 'Session not found'})}\n\n"
-            return
-        
-        # Stream progress updates
-        while True:
-            if session_id in classification_progress:
-                progress_data = classification_progress[session_id]
-                yield f"data: {json.dumps(progress_data)}\n\n"
+        with app.app_context():
+            if session_id not in upload_sessions:
+                yield f"data: {json.dumps({'error': 'Session not found'})}\n\n"
+                return
+            
+            # Changes made by other processes don't reach this process's broker, so those
+            # are picked up by re-reading the store between waits (once per interval for all
+            # of this process's streams of the session, which are then woken by the broker)
+            session = upload_sessions.get(session_id) or {}
+            poll_store = classification_progress.shared or bool(session.get('classification_job_id'))
+            poll_interval = app.config.get('PROGRESS_SHARED_POLL_SECONDS', 1)
+            wait_timeout = min(heartbeat, poll_interval) if poll_store else heartbeat
+            
+            # Make sure a new subscriber gets the current state straight away
+            sync_classification_job(session_id)
+            if progress_events.latest(session_id) is None:
+                if session_id in classification_progress:
+                    progress_events.publish(session_id, dict(classification_progress[session_id]))
+                else:
+                    # No progress data yet
+                    yield f"data: {json.dumps({'status': 'not_started', 'progress': 0})}\n\n"
+            
+            event_id = last_event_id
+            last_frame = time.monotonic()
+            while True:
+                event = progress_events.wait(session_id, event_id, wait_timeout)
+                
+                if event is None:
+                    if poll_store:
+                        refresh_progress_events(session_id, poll_interval)
+                    if time.monotonic() - last_frame >= heartbeat:
+                        # Stop once the session has been deleted or swept, rather than heartbeat forever
+                        if session_id not in upload_sessions:
+                            yield f"data: {json.dumps({'status': 'expired', 'error': 'Session not found'})}\n\n"
+                            return
+                        yield ": heartbeat\n\n"
+                        last_frame = time.monotonic()
+                    continue
+                
+                event_id, progress_data = event
+                yield f"id: {event_id}\ndata: {json.dumps(progress_data)}\n\n"
+                last_frame = time.monotonic()
                 
-                # Stop streaming when completed or failed
-                if progress_data.get('completed') or progress_data.get('status') in ['completed', 'failed']:
+                # Stop streaming when completed, failed or cancelled
+                if progress_data.get('completed') or progress_data.get('status') in ['completed', 'failed', 'cancelled']:
                     break
-            else:
-                # No progress data yet
-                yield f"data: {json.dumps({'status': 'not_started', 'progress': 0})}\n\n"
-            
-            time.sleep(0.5)  # Update every 500ms
-    
+
     return Response(generate(), mimetype='text/event-stream',
                    headers={'Cache-Control': 'no-cache', 'Connection': 'keep-alive'})
 
@@ -121,6 +225,8 @@ def get_classification_progress(session_id):
         if session_id not in upload_sessions:
             return jsonify({'error': 'Session not found'}), 404
         
+        sync_classification_job(session_id)
+        
         # Return progress if available, otherwise default status
         if session_id in classification_progress:
             return jsonify(classification_progress[session_id]), 200
@@ -144,18 +250,18 @@ def get_classification_status(session_id):
         if session_id not in upload_sessions:
             return jsonify({'error': 'Session not found'}), 404
         
+        sync_classification_job(session_id)
         session = upload_sessions[session_id]
         
         status = {
             'session_id': session_id,
             'has_categories': session.get('categories') is not None,
-            'has_classifications': session.get('classified_data') is not None,
+            'has_classifications': session.get('labels') is not None,
             'total_rows': session['total_rows']
         }
         
-        if session.get('classified_data') is not None:
-            df = session['classified_data']
-            status['category_counts'] = df['Comment Category'].value_counts().to_dict()
+        if session.get('labels') is not None:
+            status['category_counts'] = get_report_index(upload_sessions, session_id)['counts']
         
         return jsonify(status), 200
         
@@ -163,20 +269,175 @@ def get_classification_status(session_id):
         current_app.logger.error(f"Status check error: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-def perform_classification_async(app, df, verbatim_col, categories, session_id):
+@classify_bp.route('/sessions/<session_id>/classify/cancel', methods=['POST'])
+def cancel_classification(session_id):
+    """Cancel a queued or running classification job"""
+    try:
+        if session_id not in upload_sessions:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        job_id = upload_sessions[session_id].get('classification_job_id')
+        if not job_id:
+            return jsonify({'error': 'No queued classification to cancel'}), 409
+        
+        job = get_job_queue(current_app._get_current_object()).cancel(job_id)
+        sync_classification_job(session_id)
+        
+        return jsonify({
+            'session_id': session_id,
+            'job_id': job_id,
+            'job_status': job['status'] if job else None,
+            'cancel_requested': job['cancel_requested'] if job else False
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Cancel classification error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+# When each session's progress was last re-read from the store by this process
+_refreshed_at = {}
+_refresh_lock = threading.Lock()
+
+def refresh_progress_events(session_id, min_interval=0):
+    """
+    Publish progress written by other processes (job workers, other web workers).
+    
+    Reads happen at most once per min_interval seconds per session, so any number of
+    streams of one session cost a single store read per interval.
+    """
+    with _refresh_lock:
+        now = time.monotonic()
+        if now - _refreshed_at.get(session_id, float('-inf')) < min_interval:
+            return
+        _refreshed_at[session_id] = now
+        for key in [key for key, refreshed in _refreshed_at.items() if now - refreshed > 60]:
+            del _refreshed_at[key]
+    
+    sync_classification_job(session_id)
+    if classification_progress.shared and session_id in classification_progress:
+        snapshot = dict(classification_progress[session_id])
+        latest = progress_events.latest(session_id)
+        if latest is None or latest[1] != snapshot:
+            progress_events.publish(session_id, snapshot)
+
+def classification_abandoned(progress):
+    """
+    Whether a 'processing' entry was left behind by a web worker that died mid-run.
+    
+    Its owner is gone if it ran on this host and the process no longer exists, or if its
+    heartbeat (written with every progress update) is older than CLASSIFICATION_STALE_SECONDS.
+    Queued jobs have no owner; the job queue fails those whose worker is gone.
+    """
+    owner = progress.get('owner')
+    if not owner:
+        return False
+    if owner.get('host') == socket.gethostname() and not pid_alive(owner.get('pid')):
+        return True
+    heartbeat_at = progress.get('heartbeat_at') or progress.get('start_time') or 0
+    return time.time() - heartbeat_at > current_app.config.get('CLASSIFICATION_STALE_SECONDS', 900)
+
+def sync_classification_job(session_id):
+    """Mirror the progress and result of a queued classification job into this process"""
+    session = upload_sessions.get(session_id)
+    job_id = session.get('classification_job_id') if session else None
+    if not job_id:
+        return
+    
+    queue = get_job_queue(current_app._get_current_object())
+    job = queue.get(job_id)
+    if job is None:
+        return
+    
+    progress = dict(job['progress'] or {})
+    progress['job_status'] = job['status']
+    
+    if job['status'] == 'queued':
+        progress['current_step'] = f"Queued for classification ({queue.queue_position(job)} jobs ahead)"
+    elif job['status'] == 'completed':
+        upload_sessions.patch(session_id, {
+            **classification_fields(queue.load_result(job_id)),
+            'classification_job_id': None
+        })
+        start_insights(current_app._get_current_object(), upload_sessions, session_id)
+        progress.update({
+            'status': 'completed',
+            'progress': 100,
+            'processed': progress.get('total', 0),
+            'remaining': 0,
+            'current_step': 'Classification completed',
+            'completed': True,
+            'estimated_time_remaining': 0
+        })
+    elif job['status'] == 'failed':
+        upload_sessions.patch(session_id, {'classification_job_id': None})
+        progress.update({
+            'status': 'failed',
+            'current_step': f"Classification failed: {job['error']}",
+            'completed': False,
+            'estimated_time_remaining': None,
+            'error': job['error']
+        })
+    elif job['status'] == 'cancelled':
+        upload_sessions.patch(session_id, {'classification_job_id': None})
+        progress.update({
+            'status': 'cancelled',
+            'current_step': 'Classification cancelled',
+            'completed': False,
+            'estimated_time_remaining': None
+        })
+    
+    # Only write (and wake progress streams) when something changed
+    current = classification_progress.get(session_id) or {}
+    if any(current.get(field) != value for field, value in progress.items()):
+        classification_progress.patch(session_id, progress)
+
+def run_classification_job(queue, job, payload):
+    """Run a queued classification inside a job worker process"""
+    session_id = job['session_id']
+    classification_progress[session_id] = payload['progress']
+    
+    # Publish progress to the queue so web workers can report it
+    stop_publishing = threading.Event()
+    
+    def publish_progress():
+        while not stop_publishing.wait(0.5):
+            queue.update_progress(job['id'], dict(classification_progress[session_id]))
+    
+    publisher = threading.Thread(target=publish_progress, daemon=True)
+    publisher.start()
+    try:
+        df = load_frame(payload['data_path'], [payload['verbatim_column']])
+        labels = perform_classification(
+            df, payload['verbatim_column'], payload['categories'], session_id, payload['mode']
+        )
+        discard_journal(current_app.config['UPLOAD_FOLDER'], session_id)
+    finally:
+        stop_publishing.set()
+        publisher.join()
+        queue.update_progress(job['id'], dict(classification_progress[session_id]))
+        # A process-local copy of the progress is no longer needed
+        if not classification_progress.shared:
+            del classification_progress[session_id]
+    
+    return labels
+
+def perform_classification_async(app, df, verbatim_col, categories, session_id, mode='llm'):
     """Perform classification in background thread with proper error handling"""
     with app.app_context():
         try:
             current_app.logger.info(f"Starting background classification for session {session_id}")
-            classified_df = perform_classification(df, verbatim_col, categories, session_id)
+            labels = perform_classification(df, verbatim_col, categories, session_id, mode)
             
-            # Store classified data back to session
+            # Store the labels back to session, grouped by category for the reports
             if session_id in upload_sessions:
-                upload_sessions[session_id]['classified_data'] = classified_df
+                upload_sessions.patch(session_id, classification_fields(labels, df[verbatim_col]))
                 current_app.logger.info(f"Stored classified data for session {session_id}")
             
-            # Mark as completed
-            classification_progress[session_id] = {
+            # The checkpoint is only needed to resume interrupted runs
+            discard_journal(current_app.config['UPLOAD_FOLDER'], session_id)
+            
+            # Mark as completed (keeping run statistics such as cache hits)
+            classification_progress.patch(session_id, {
                 'status': 'completed',
                 'progress': 100,
                 'total': len(df),
@@ -187,9 +448,12 @@ def perform_classification_async(app, df, verbatim_col, categories, session_id):
                 'start_time': classification_progress[session_id].get('start_time', time.time()),
                 'estimated_time_remaining': 0,
                 'processing_rate': classification_progress[session_id].get('processing_rate', 0)
-            }
+            })
             current_app.logger.info(f"Classification completed for session {session_id}")
             
+            # Have the report insights ready by the time the user opens the report
+            start_insights(app, upload_sessions, session_id)
+            
         except Exception as e:
             current_app.logger.error(f"Background classification error: {e}")
             import traceback
@@ -206,27 +470,28 @@ def perform_classification_async(app, df, verbatim_col, categories, session_id):
                 'start_time': classification_progress[session_id].get('start_time', time.time()),
                 'estimated_time_remaining': None,
                 'processing_rate': classification_progress[session_id].get('processing_rate', 0),
+                'failed_comments': classification_progress[session_id].get('failed_comments', 0),
                 'error': str(e)
             }
 
-def perform_classification(df, verbatim_col, categories, session_id):
-    """Perform the actual classification of comments"""
-    # Create a copy of the dataframe
-    classified_df = df.copy()
-    
+def perform_classification(df, verbatim_col, categories, session_id, mode='llm'):
+    """Classify the comments in df[verbatim_col], returning a 'Comment Category' Series aligned with df"""
     # Update progress
-    classification_progress[session_id]['current_step'] = 'Analyzing comments...'
-    classification_progress[session_id]['progress'] = 10
+    classification_progress.patch(session_id, {'current_step': 'Analyzing comments...'})
+    classification_progress.patch(session_id, {'progress': 10})
+    
+    # Rows are counted as they finish, so progress stays monotonic across concurrent batches
+    tracker = ProgressTracker(len(df), classification_progress[session_id].get('start_time'))
     
     # Get non-empty comments
     comments = df[verbatim_col].dropna().astype(str)
     comments = comments[comments.str.len() > 0]
+    tracker.skip(len(df) - len(comments))
     
     if len(comments) == 0:
-        # If no comments, create empty category column
-        classified_df['Comment Category'] = 'No Comment'
-        classification_progress[session_id]['progress'] = 90
-        return classified_df
+        # If no comments, every row gets the empty category
+        classification_progress.patch(session_id, {'progress': 90})
+        return pd.Series('No Comment', index=df.index, name=CATEGORY_COLUMN)
     
     # Prepare category titles for LLM
     category_titles = [cat['title'] for cat in categories]
@@ -235,44 +500,214 @@ def perform_classification(df, verbatim_col, categories, session_id):
     if "No Comment" not in category_titles:
         category_titles.append("No Comment")
     
+    # Collapse duplicate comments so each distinct comment is classified once
+    classification_progress.patch(session_id, {'current_step': 'Grouping duplicate comments...'})
+    dedup_mode = current_app.config.get('DEDUP_MODE', 'exact')
+    with tracker.phase('deduplication'):
+        unique_comments, representative_of = collapse_duplicates(
+            comments, mode=dedup_mode, threshold=current_app.config.get('NEAR_DUPLICATE_THRESHOLD', 0.9)
+        )
+    # Each unique comment finishes the rows of its whole duplicate group
+    tracker.row_weights = representative_of.value_counts().to_dict()
+    classification_progress.patch(session_id, {
+        'dedup_mode': dedup_mode,
+        'unique_comments': len(unique_comments),
+        'duplicate_reduction': round(1 - len(unique_comments) / len(comments), 4)
+    })
+    current_app.logger.info(f"Collapsed {len(comments)} comments to {len(unique_comments)} unique ({dedup_mode} mode)")
+    
     # Update progress
-    classification_progress[session_id]['current_step'] = 'Classifying comments...'
-    classification_progress[session_id]['progress'] = 20
+    classification_progress.patch(session_id, {'current_step': 'Classifying comments...'})
+    classification_progress.patch(session_id, {'progress': 20})
     
     # Initialize results
     classifications = {}
     
-    if current_app.config.get('OPENAI_API_KEY'):
-        # Use OpenAI for classification
-        classifications = classify_with_llm(comments, category_titles, session_id)
+    if current_app.config.get('OPENAI_API_KEY') and mode == 'embedding':
+        # Nearest category embedding, with only ambiguous comments sent to the LLM
+        classifications = classify_with_embeddings(unique_comments, categories, category_titles, session_id, tracker)
+    elif current_app.config.get('OPENAI_API_KEY'):
+        # Use OpenAI for classification, skipping comments already in the cache
+        classifications = classify_with_llm_cached(unique_comments, categories, category_titles, session_id, tracker)
     else:
         # Fallback to simple keyword matching
-        classifications = classify_with_keywords(comments, categories, session_id)
+        classifications = classify_with_keywords(unique_comments, categories, session_id, tracker)
+    
+    # Comments whose requests were still throttled or failing after retries must not get the
+    # default label. They weren't cached or checkpointed, so running the classification again
+    # retries only them.
+    unresolved = unique_comments[
+        ~unique_comments.index.isin(list(classifications)) & (unique_comments.str.strip().str.len() > 0)
+    ]
+    if len(unresolved) > 0:
+        failed_comments = tracker.count_rows(unresolved.index)
+        classification_progress.patch(session_id, {'failed_comments': failed_comments})
+        raise RuntimeError(
+            f"{failed_comments} comments could not be classified (OpenAI requests were still rate limited "
+            f"or unavailable after retries). Run the classification again to retry them; finished comments are kept."
+        )
+    
+    # Comments the API rejected outright (None) would fail the same way on every run, so they
+    # get the default label like before, and are counted
+    defaulted_comments = tracker.count_rows([idx for idx, category in classifications.items() if category is None])
+    if defaulted_comments:
+        current_app.logger.warning(f"{defaulted_comments} comments for session {session_id} could not be classified, using default")
     
     # Update progress
-    classification_progress[session_id]['current_step'] = 'Finalizing results...'
-    classification_progress[session_id]['progress'] = 90
+    classification_progress.patch(session_id, {'current_step': 'Finalizing results...'})
+    classification_progress.patch(session_id, {'progress': 90})
     
-    # Apply classifications to dataframe
-    classified_df['Comment Category'] = classified_df.apply(
-        lambda row: get_classification_for_row(row, verbatim_col, classifications, category_titles, categories),
-        axis=1
+    with tracker.phase('finalization'):
+        # Give every duplicate the label of its group representative
+        classifications = expand_classifications(classifications, representative_of)
+        
+        # Label every row; the labels are stored apart from the uploaded data
+        labels, invalid_labels = label_rows(df[verbatim_col], classifications, category_titles)
+    
+    if invalid_labels:
+        current_app.logger.warning(f"{invalid_labels} classifications for session {session_id} were not in the expected categories, using default")
+    classification_progress.patch(session_id, {
+        **tracker.snapshot(),
+        'invalid_labels': invalid_labels,
+        'defaulted_comments': defaulted_comments
+    })
+    return labels
+
+def report_progress(session_id, tracker, current_step):
+    """Publish the tracker's counts, mapping the classification stage onto 20-80%"""
+    snapshot = tracker.snapshot()
+    snapshot['progress'] = 20 + int(60 * snapshot['processed'] / max(tracker.total, 1))
+    snapshot['current_step'] = current_step
+    classification_progress.patch(session_id, snapshot)
+
+def classify_with_llm_cached(comments, categories, category_titles, session_id, tracker):
+    """Classify comments with the LLM, reusing results cached by previous runs"""
+    cache = get_classification_cache()
+    if cache is None:
+        return classify_with_llm(comments, categories, category_titles, session_id, tracker)
+    
+    model = current_app.config['CLASSIFICATION_MODEL']
+    category_hash = category_set_hash(categories)
+    
+    # Look up every distinct comment once; ignore entries no longer valid for this category set
+    cached = cache.get_many(comments.unique().tolist(), category_hash, model)
+    cached = {comment: category for comment, category in cached.items() if category in category_titles}
+    
+    hit_mask = comments.isin(set(cached))
+    classifications = comments[hit_mask].map(cached).to_dict()
+    misses = comments[~hit_mask]
+    tracker.skip(tracker.count_rows(classifications))
+    
+    classification_progress.patch(session_id, {
+        'cache_hits': int(hit_mask.sum()),
+        'cache_misses': len(misses)
+    })
+    current_app.logger.info(f"Classification cache for session {session_id}: {int(hit_mask.sum())} hits, {len(misses)} misses")
+    
+    if len(misses) > 0:
+        new_classifications = classify_with_llm(misses, categories, category_titles, session_id, tracker)
+        classifications.update(new_classifications)
+        
+        # Only cache valid answers so failed calls are retried on the next run
+        cache.set_many(
+            {misses[idx]: category for idx, category in new_classifications.items() if category in category_titles}.items(),
+            category_hash,
+            model
+        )
+    
+    return classifications
+
+def classify_with_embeddings(comments, categories, category_titles, session_id, tracker):
+    """Classify comments by nearest category embedding, escalating ambiguous ones to the LLM"""
+    classifications, escalated = asyncio.run(
+        classify_with_embeddings_async(comments, categories, category_titles, session_id, tracker)
     )
     
-    return classified_df
+    # Reported in rows like the rest of the progress (a deduplicated comment stands for its whole group)
+    resolved_rows = tracker.count_rows(classifications)
+    escalated_rows = tracker.count_rows(escalated.index)
+    classification_progress.patch(session_id, {
+        'resolved_locally': resolved_rows,
+        'escalated': escalated_rows
+    })
+    current_app.logger.info(f"Embedding classification for session {session_id}: {resolved_rows} rows resolved locally, {escalated_rows} escalated")
+    
+    if len(escalated) > 0:
+        classification_progress.patch(session_id, {'current_step': f'Sending {len(escalated)} ambiguous comments to AI...'})
+        classifications.update(classify_with_llm_cached(escalated, categories, category_titles, session_id, tracker))
+    
+    return classifications
 
-def classify_with_llm(comments, category_titles, session_id):
+async def classify_with_embeddings_async(comments, categories, category_titles, session_id, tracker):
+    """Embed all comments in bulk and assign each to its nearest category vector"""
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI(api_key=current_app.config['OPENAI_API_KEY'])
+    threshold = current_app.config.get('EMBEDDING_MARGIN_THRESHOLD', 0.05)
+    
+    classification_progress.patch(session_id, {'current_step': f'Embedding {len(comments)} comments...'})
+    
+    # Use the user's own category descriptions for matching
+    descriptions = {cat['title']: cat['description'] for cat in categories}
+    category_matrix = await build_category_matrix(client, category_titles, descriptions)
+    
+    # Blank comments are labelled "No Comment" later and can't be embedded
+    blank_mask = comments.str.strip().str.len() == 0
+    tracker.skip(tracker.count_rows(comments.index[blank_mask]))
+    comments = comments[~blank_mask]
+    if len(comments) == 0:
+        return {}, comments
+    
+    with tracker.phase('embedding'):
+        comment_matrix = await embed_texts(client, comments.tolist(), current_app.config['EMBEDDING_MODEL'])
+    similarities = comment_matrix @ category_matrix.T
+    best_positions = similarities.argmax(axis=1)
+    
+    # Escalate comments whose top two categories are too close to call
+    if len(category_titles) > 1:
+        top_two = np.partition(similarities, -2, axis=1)[:, -2:]
+        margins = top_two[:, 1] - top_two[:, 0]
+        local_mask = margins >= threshold
+    else:
+        local_mask = np.ones(len(comments), dtype=bool)
+    
+    titles = np.array(category_titles, dtype=object)
+    classifications = dict(zip(comments.index[local_mask], titles[best_positions[local_mask]]))
+    
+    tracker.advance(tracker.count_rows(classifications))
+    report_progress(session_id, tracker, f'Embedded {len(comments)} comments')
+    return classifications, comments[~local_mask]
+
+def classify_with_llm(comments, categories, category_titles, session_id, tracker):
     """Classify comments using OpenAI API with async batching for efficiency"""
-    # Run the async classification in a new event loop
-    return asyncio.run(classify_with_llm_async(comments, category_titles, session_id))
+    journal = ClassificationJournal(
+        journal_path(current_app.config['UPLOAD_FOLDER'], session_id),
+        ClassificationJournal.make_run_key(
+            category_set_hash(categories), category_titles, current_app.config['CLASSIFICATION_MODEL']
+        )
+    )
+    
+    # Resume from batches checkpointed by an interrupted run
+    classifications = journal.completed(comments)
+    if classifications:
+        current_app.logger.info(f"Resuming session {session_id}: {len(classifications)} comments restored from checkpoint")
+        classification_progress.patch(session_id, {'resumed_from_checkpoint': len(classifications)})
+        tracker.skip(tracker.count_rows(classifications))
+        comments = comments[~comments.index.isin(list(classifications))]
+    
+    if len(comments) > 0:
+        # Run the async classification in a new event loop
+        classifications.update(asyncio.run(classify_with_llm_async(comments, category_titles, session_id, tracker, journal)))
+    
+    return classifications
 
-async def classify_with_llm_async(comments, category_titles, session_id):
+async def classify_with_llm_async(comments, category_titles, session_id, tracker, journal=None):
     """Async version of classify_with_llm with improved batching"""
+    from openai import AsyncOpenAI
     client = AsyncOpenAI(api_key=current_app.config['OPENAI_API_KEY'])
     classifications = {}
     
-    # Semaphore to control concurrent requests (don't exceed rate limits)
-    semaphore = asyncio.Semaphore(10)
+    # Scheduler keeps requests within the org's rate limits and retries throttled calls
+    scheduler = RateLimitScheduler.from_config(current_app.config)
     
     # Prepare system message for batch processing
     system_message = f"""You are an expert at analyzing customer feedback to identify specific issues and problems.
@@ -296,20 +731,39 @@ EXAMPLES:
 Output a JSON object with "categories" array and "confidence" array (0-100 for each):
 {{"categories": ["Category1", "Category2"], "confidence": [95, 80]}}"""
     
-    # Process comments in batches - send multiple comments per API call
-    batch_size = 10  # Reduced batch size to avoid token limits with confidence scores
-    comment_list = comments.tolist()
-    comment_indices = comments.index.tolist()
-    total_batches = len(range(0, len(comment_list), batch_size))
+    # Embed the categories once for all semantic re-checks in this run
+    try:
+        category_matrix = await build_category_matrix(client, category_titles)
+    except Exception as e:
+        current_app.logger.error(f"Failed to embed categories, semantic validation disabled: {e}")
+        category_matrix = None
+    
+    # Process comments in batches - send multiple comments per API call, packed by token budget
+    batches = build_token_batches(comments.tolist(), comments.index.tolist(), category_titles)
+    total_batches = len(batches)
+    current_app.logger.info(f"Packed {len(comments)} comments into {total_batches} batches")
+    
+    completed_batches = 0
+    
+    async def classify_and_checkpoint(batch_task, batch_indices):
+        nonlocal completed_batches
+        try:
+            # Persist each batch as soon as it finishes so an interrupted run can resume
+            result = await batch_task
+            if journal is not None and result:
+                journal.record(result, comments)
+            return result
+        finally:
+            # Count the batch when it finishes (failed rows fall back to the default label)
+            completed_batches += 1
+            tracker.advance(tracker.count_rows(batch_indices))
+            report_progress(session_id, tracker, f'Completed batch {completed_batches} of {total_batches} ({tracker.processed}/{tracker.total} comments)')
     
     # Create tasks for all batches
     tasks = []
-    for batch_num, i in enumerate(range(0, len(comment_list), batch_size)):
-        batch_comments = comment_list[i:i + batch_size]
-        batch_indices = comment_indices[i:i + batch_size]
-        
-        task = classify_batch_async(client, semaphore, system_message, batch_comments, batch_indices, category_titles, session_id, batch_num, total_batches)
-        tasks.append(task)
+    for batch_num, (batch_comments, batch_indices, max_tokens) in enumerate(batches):
+        task = classify_batch_async(client, scheduler, system_message, batch_comments, batch_indices, category_titles, category_matrix, tracker, batch_num, session_id, max_tokens)
+        tasks.append(classify_and_checkpoint(task, batch_indices))
     
     # Execute all batches concurrently
     batch_results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -324,113 +778,148 @@ Output a JSON object with "categories" array and "confidence" array (0-100 for e
     
     return classifications
 
-async def classify_batch_async(client, semaphore, system_message, batch_comments, batch_indices, category_titles, session_id, batch_num, total_batches):
-    """Classify a batch of comments asynchronously"""
-    async with semaphore:
+def estimate_tokens(text):
+    """Rough token count for budgeting (about four characters per token)"""
+    return len(str(text)) // 4 + 1
+
+def build_token_batches(comment_list, comment_indices, category_titles):
+    """
+    Pack comments into batches bounded by estimated input and output tokens.
+    
+    Returns a list of (batch_comments, batch_indices, max_tokens) tuples.
+    """
+    max_input_tokens = current_app.config.get('BATCH_MAX_INPUT_TOKENS', 3000)
+    max_output_tokens = current_app.config.get('BATCH_MAX_OUTPUT_TOKENS', 1500)
+    max_comments = current_app.config.get('BATCH_MAX_COMMENTS', 50)
+    
+    # Each answer is a quoted category title plus a confidence value and JSON punctuation
+    output_per_comment = max(estimate_tokens(title) for title in category_titles) + 8
+    max_comments = max(1, min(max_comments, max_output_tokens // output_per_comment))
+    
+    batches = []
+    batch_comments, batch_indices, batch_tokens = [], [], 0
+    
+    def close_batch():
+        # Headroom for the JSON envelope and tokenizer estimate error
+        max_tokens = min(max_output_tokens, int(len(batch_comments) * output_per_comment * 1.25) + 20)
+        batches.append((batch_comments, batch_indices, max_tokens))
+    
+    for comment, idx in zip(comment_list, comment_indices):
+        comment_tokens = estimate_tokens(comment) + 4  # Numbering and newline
+        if batch_comments and (len(batch_comments) >= max_comments or batch_tokens + comment_tokens > max_input_tokens):
+            close_batch()
+            batch_comments, batch_indices, batch_tokens = [], [], 0
+        batch_comments.append(comment)
+        batch_indices.append(idx)
+        batch_tokens += comment_tokens
+    
+    if batch_comments:
+        close_batch()
+    
+    return batches
+
+async def classify_batch_async(client, scheduler, system_message, batch_comments, batch_indices, category_titles, category_matrix, tracker, batch_num, session_id, max_tokens=200):
+    """Classify a batch of comments asynchronously (progress is reported by the caller when it finishes)"""
+    try:
+        # Create user message with numbered comments
+        user_message = "\n".join([f"{i+1}. {comment}" for i, comment in enumerate(batch_comments)])
+        
+        # Use gpt-4o for best classification accuracy; retries are left to the scheduler
+        with tracker.phase('llm'):
+            response = await scheduler.run(
+                lambda: client.with_options(max_retries=0).chat.completions.with_raw_response.create(
+                    model=current_app.config['CLASSIFICATION_MODEL'],
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": user_message}
+                    ],
+                    response_format={"type": "json_object"},
+                    max_tokens=max_tokens,
+                    temperature=0
+                ),
+                estimate_tokens(system_message) + estimate_tokens(user_message) + max_tokens
+            )
+        classification_progress.patch(session_id, scheduler.stats())
+        
+        # Parse the JSON response
+        result_text = response.choices[0].message.content.strip()
+        
         try:
-            # Update progress with detailed information
-            progress = 20 + int((batch_num / total_batches) * 60)  # Progress from 20% to 80%
-            processed = batch_num * len(batch_comments)
-            total_comments = classification_progress[session_id]['total']
-            remaining = total_comments - processed
-            
-            # Calculate processing rate and time estimation
-            start_time = classification_progress[session_id].get('start_time', time.time())
-            elapsed_time = time.time() - start_time
-            
-            if elapsed_time > 0 and processed > 0:
-                processing_rate = processed / elapsed_time  # comments per second
-                estimated_time_remaining = remaining / processing_rate if processing_rate > 0 else None
+            # Try to parse as JSON object with categories and confidence
+            if result_text.startswith('{'):
+                result_obj = json.loads(result_text)
+                categories_result = result_obj.get('categories', [])
+                confidence_result = result_obj.get('confidence', [])
             else:
-                processing_rate = 0
-                estimated_time_remaining = None
+                # Fallback to array format (legacy)
+                categories_result = json.loads(result_text)
+                confidence_result = [None] * len(categories_result)
             
-            classification_progress[session_id].update({
-                'progress': progress,
-                'processed': processed,
-                'remaining': remaining,
-                'current_step': f'Processing batch {batch_num + 1} of {total_batches} ({processed}/{total_comments} comments)',
-                'processing_rate': round(processing_rate, 2),
-                'estimated_time_remaining': round(estimated_time_remaining) if estimated_time_remaining else None
-            })
+            # Map results to indices - ensure we have the right number of results
+            batch_classifications = {}
+            if len(categories_result) != len(batch_indices):
+                current_app.logger.warning(f"Batch {batch_num}: Expected {len(batch_indices)} results, got {len(categories_result)}")
             
-            # Create user message with numbered comments
-            user_message = "\n".join([f"{i+1}. {comment}" for i, comment in enumerate(batch_comments)])
+            # Rows needing semantic validation: (position, original category, confidence)
+            semantic_checks = []
+            for i, idx in enumerate(batch_indices):
+                if i < len(categories_result):
+                    category = categories_result[i]
+                    confidence = confidence_result[i] if i < len(confidence_result) else None
+                    
+                    # Use semantic validation for low confidence or invalid categories
+                    if confidence is not None and confidence < 70:
+                        current_app.logger.info(f"Low confidence ({confidence}%) for comment {idx}, using semantic validation")
+                        semantic_checks.append((i, category, confidence))
+                    elif category in category_titles:
+                        batch_classifications[idx] = category
+                    else:
+                        current_app.logger.warning(f"Invalid category '{category}' returned for comment {idx}, using semantic validation")
+                        semantic_checks.append((i, None, None))
+                else:
+                    # Fallback if not enough results
+                    current_app.logger.warning(f"Missing result for comment {idx}, using semantic validation")
+                    semantic_checks.append((i, None, None))
             
-            # Use gpt-4o for best classification accuracy
-            response = await client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=200,
-                temperature=0
-            )
+            # Resolve all semantic checks for this batch with a single embeddings request
+            if semantic_checks:
+                with tracker.phase('semantic_recheck'):
+                    semantic_results = await find_best_categories_semantic(
+                        client,
+                        [batch_comments[i] for i, _, _ in semantic_checks],
+                        category_titles,
+                        category_matrix,
+                        [original for _, original, _ in semantic_checks],
+                        [confidence for _, _, confidence in semantic_checks]
+                    )
+                for (i, _, _), (category, confidence, reason) in zip(semantic_checks, semantic_results):
+                    # Without a valid label from either check the comment gets the default
+                    # (None keeps it out of the cache and journal)
+                    batch_classifications[batch_indices[i]] = category if category in category_titles else None
             
-            # Parse the JSON response
-            result_text = response.choices[0].message.content.strip()
+            return batch_classifications
             
-            try:
-                # Try to parse as JSON object with categories and confidence
-                if result_text.startswith('{'):
-                    result_obj = json.loads(result_text)
-                    categories_result = result_obj.get('categories', [])
-                    confidence_result = result_obj.get('confidence', [])
-                else:
-                    # Fallback to array format (legacy)
-                    categories_result = json.loads(result_text)
-                    confidence_result = [None] * len(categories_result)
-                
-                # Map results to indices - ensure we have the right number of results
-                batch_classifications = {}
-                if len(categories_result) != len(batch_indices):
-                    current_app.logger.warning(f"Batch {batch_num}: Expected {len(batch_indices)} results, got {len(categories_result)}")
-                
-                for i, idx in enumerate(batch_indices):
-                    if i < len(categories_result):
-                        category = categories_result[i]
-                        confidence = confidence_result[i] if i < len(confidence_result) else None
-                        
-                        # Use semantic validation for low confidence or invalid categories
-                        if confidence is not None and confidence < 70:
-                            current_app.logger.info(f"Low confidence ({confidence}%) for comment {idx}, using semantic validation")
-                            category, confidence, reason = await find_best_category_semantic(
-                                client, batch_comments[i], category_titles, category, confidence
-                            )
-                        
-                        # Validate category
-                        if category in category_titles:
-                            batch_classifications[idx] = category
-                        else:
-                            current_app.logger.warning(f"Invalid category '{category}' returned for comment {idx}, using semantic validation")
-                            category, confidence, reason = await find_best_category_semantic(
-                                client, batch_comments[i], category_titles
-                            )
-                            batch_classifications[idx] = category
-                    else:
-                        # Fallback if not enough results
-                        current_app.logger.warning(f"Missing result for comment {idx}, using semantic validation")
-                        category, confidence, reason = await find_best_category_semantic(
-                            client, batch_comments[i], category_titles
-                        )
-                        batch_classifications[idx] = category
-                
-                return batch_classifications
-                
-            except json.JSONDecodeError as e:
-                current_app.logger.error(f"JSON parsing failed for batch {batch_num}: {e}")
-                current_app.logger.error(f"Response content: {result_text}")
-                # Fallback to individual processing
-                return await fallback_individual_classification(client, semaphore, batch_comments, batch_indices, category_titles)
-                
-        except Exception as e:
-            current_app.logger.error(f"Batch {batch_num} classification failed: {e}")
+        except json.JSONDecodeError as e:
+            current_app.logger.error(f"JSON parsing failed for batch {batch_num}: {e}")
+            current_app.logger.error(f"Response content: {result_text}")
             # Fallback to individual processing
-            return await fallback_individual_classification(client, semaphore, batch_comments, batch_indices, category_titles)
+            with tracker.phase('llm_fallback'):
+                return await fallback_individual_classification(client, scheduler, batch_comments, batch_indices, category_titles)
+            
+    except RateLimitExceeded as e:
+        # Splitting into single-comment calls would only multiply throttled requests; the
+        # batch is left unclassified and fails the run (see perform_classification)
+        current_app.logger.error(f"Batch {batch_num} still failing after retries: {e}")
+        classification_progress.patch(session_id, scheduler.stats())
+        return {}
+        
+    except Exception as e:
+        current_app.logger.error(f"Batch {batch_num} classification failed: {e}")
+        # Fallback to individual processing
+        with tracker.phase('llm_fallback'):
+            return await fallback_individual_classification(client, scheduler, batch_comments, batch_indices, category_titles)
 
-async def fallback_individual_classification(client, semaphore, batch_comments, batch_indices, category_titles):
+async def fallback_individual_classification(client, scheduler, batch_comments, batch_indices, category_titles):
     """Fallback to individual comment classification if batch fails"""
     classifications = {}
     
@@ -445,7 +934,7 @@ RULES:
     # Process individual comments
     tasks = []
     for comment, idx in zip(batch_comments, batch_indices):
-        task = classify_single_comment_async(client, semaphore, system_message, comment, idx, category_titles)
+        task = classify_single_comment_async(client, scheduler, system_message, comment, idx, category_titles)
         tasks.append(task)
     
     results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -460,36 +949,45 @@ RULES:
     
     return classifications
 
-async def classify_single_comment_async(client, semaphore, system_message, comment, idx, category_titles):
+async def classify_single_comment_async(client, scheduler, system_message, comment, idx, category_titles):
     """Classify a single comment asynchronously"""
-    async with semaphore:
-        try:
-            # Use gpt-4o for best classification accuracy
-            response = await client.chat.completions.create(
-                model="gpt-4o",
+    try:
+        # Use gpt-4o for best classification accuracy
+        response = await scheduler.run(
+            lambda: client.with_options(max_retries=0).chat.completions.with_raw_response.create(
+                model=current_app.config['CLASSIFICATION_MODEL'],
                 messages=[
                     {"role": "system", "content": system_message},
                     {"role": "user", "content": str(comment)}
                 ],
                 max_tokens=20,
                 temperature=0
-            )
-            
-            result = response.choices[0].message.content.strip()
-            
-            # Validate result
-            if result in category_titles:
-                return (idx, result)
-            else:
-                current_app.logger.warning(f"Invalid category '{result}' for comment {idx}, using default")
-                return (idx, category_titles[0])
-                
-        except Exception as e:
-            current_app.logger.error(f"Single comment classification failed for {idx}: {e}")
+            ),
+            estimate_tokens(system_message) + estimate_tokens(comment) + 20
+        )
+        
+        result = response.choices[0].message.content.strip()
+        
+        # Validate result
+        if result in category_titles:
+            return (idx, result)
+        else:
+            current_app.logger.warning(f"Invalid category '{result}' for comment {idx}, using default")
             return (idx, category_titles[0])
+            
+    except RateLimitExceeded as e:
+        # Leave the comment unclassified so the run fails and a rerun retries it
+        current_app.logger.error(f"Single comment classification still failing after retries for {idx}: {e}")
+        return None
+        
+    except Exception as e:
+        # Rejected requests (e.g. a content filter 400) fail the same way every time, so the
+        # comment gets the default label without being written to the classification cache
+        current_app.logger.error(f"Single comment classification failed for {idx}: {e}")
+        return (idx, None)
 
 
-def classify_with_keywords(comments, categories, session_id):
+def classify_with_keywords(comments, categories, session_id, tracker):
     """Fallback classification using keyword matching"""
     classifications = {}
     
@@ -521,32 +1019,15 @@ def classify_with_keywords(comments, categories, session_id):
     
     # Classify each comment with progress tracking
     total_comments = len(comments)
-    start_time = classification_progress[session_id].get('start_time', time.time())
+    block = []
     
     for i, (idx, comment) in enumerate(comments.items()):
         # Update progress every 50 comments
-        if i % 50 == 0:
-            progress = 20 + int((i / total_comments) * 60)  # Progress from 20% to 80%
-            processed = i
-            remaining = total_comments - processed
-            
-            # Calculate processing rate and time estimation
-            elapsed_time = time.time() - start_time
-            if elapsed_time > 0 and processed > 0:
-                processing_rate = processed / elapsed_time  # comments per second
-                estimated_time_remaining = remaining / processing_rate if processing_rate > 0 else None
-            else:
-                processing_rate = 0
-                estimated_time_remaining = None
-            
-            classification_progress[session_id].update({
-                'progress': progress,
-                'processed': processed,
-                'remaining': remaining,
-                'current_step': f'Classifying comment {i + 1} of {total_comments} (keyword matching)',
-                'processing_rate': round(processing_rate, 2),
-                'estimated_time_remaining': round(estimated_time_remaining) if estimated_time_remaining else None
-            })
+        if len(block) == 50:
+            tracker.advance(tracker.count_rows(block))
+            block = []
+            report_progress(session_id, tracker, f'Classifying comment {i + 1} of {total_comments} (keyword matching)')
+        block.append(idx)
         
         comment_lower = str(comment).lower()
         best_category = categories[0]['title']  # Default
@@ -560,74 +1041,120 @@ def classify_with_keywords(comments, categories, session_id):
         
         classifications[idx] = best_category
     
+    tracker.advance(tracker.count_rows(block))
     return classifications
 
-def get_classification_for_row(row, verbatim_col, classifications, category_titles, categories):
-    """Get classification for a specific row"""
-    comment = row[verbatim_col]
+def label_rows(comments, classifications, category_titles):
+    """
+    Build the 'Comment Category' column for every row of the verbatim column.
     
-    # Check if comment is empty or null
-    if pd.isna(comment) or str(comment).strip() == '':
-        return 'No Comment'
+    Blank rows get "No Comment"; unclassified rows and labels outside category_titles get
+    the default category. Returns (labels, number of invalid labels replaced).
+    """
+    default = category_titles[0] if category_titles else 'Other'
+    labels = classifications.reindex(comments.index)
     
-    # Get classification from our results
-    classification = classifications.get(row.name, category_titles[0] if category_titles else 'Other')
+    # Validate that the classifications are our expected categories
+    invalid_mask = labels.notna() & ~labels.isin(category_titles)
+    labels = labels.mask(invalid_mask).fillna(default)
     
-    # Validate that the classification is one of our expected categories
-    if classification not in category_titles:
-        current_app.logger.warning(f"Classification '{classification}' not in expected categories {category_titles}, using default")
-        return category_titles[0] if category_titles else 'Other'
+    # Check for empty or null comments
+    blank_mask = comments.isna() | (comments.astype(str).str.strip() == '')
+    labels[blank_mask] = 'No Comment'
     
-    return classification
+    return labels.rename(CATEGORY_COLUMN), int((invalid_mask & ~blank_mask).sum())
 
-async def find_best_category_semantic(client, comment, category_titles, original_category=None, confidence=None):
-    """Find the best category using semantic similarity across all categories"""
-    try:
-        # Only do semantic re-classification if confidence is low or not provided
-        confidence_threshold = 70  # Only re-classify if confidence < 70%
+async def build_category_matrix(client, category_titles, descriptions=None):
+    """Embed every category once, returning a row-normalized matrix aligned with category_titles"""
+    model = current_app.config['EMBEDDING_MODEL']
+    descriptions = descriptions or {}
+    texts = [
+        f"{category}: {descriptions.get(category) or get_category_description(category, category_titles)}"
+        for category in category_titles
+    ]
+    
+    # Category embeddings are persisted across runs, keyed on the category text
+    cache = get_embedding_cache()
+    vectors = cache.get_many(texts, model) if cache is not None else {}
+    missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+    
+    if missing:
+        new_vectors = dict(zip(missing, await embed_texts(client, missing, model)))
+        vectors.update(new_vectors)
+        if cache is not None:
+            cache.set_many(new_vectors.items(), model)
+    
+    matrix = np.vstack([vectors[text] for text in texts])
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+async def embed_texts(client, texts, model):
+    """Embed texts with multi-input requests, returning a row-normalized matrix"""
+    chunks = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+    responses = await asyncio.gather(*[
+        client.embeddings.create(input=chunk, model=model) for chunk in chunks
+    ])
+    
+    vectors = []
+    for response in responses:
+        for item in sorted(response.data, key=lambda item: item.index):
+            vectors.append(np.array(item.embedding, dtype=np.float32))
+    
+    matrix = np.vstack(vectors)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+async def find_best_categories_semantic(client, comments, category_titles, category_matrix, original_categories=None, confidences=None):
+    """Find the best category for several comments using semantic similarity across all categories"""
+    original_categories = original_categories or [None] * len(comments)
+    confidences = confidences or [None] * len(comments)
+    results = list(zip(original_categories, confidences, ["Semantic check not run"] * len(comments)))
+    
+    # Only do semantic re-classification if confidence is low or not provided
+    confidence_threshold = 70  # Only re-classify if confidence < 70%
+    positions = []
+    for position, (comment, confidence) in enumerate(zip(comments, confidences)):
         if confidence is not None and confidence >= confidence_threshold:
-            return original_category, confidence, "High confidence, skipping semantic check"
-        
-        # Create embedding for the comment
-        comment_embedding_response = await client.embeddings.create(
-            input=str(comment),
-            model="text-embedding-3-small"
+            results[position] = (original_categories[position], confidence, "High confidence, skipping semantic check")
+        elif str(comment).strip():
+            # The embeddings endpoint rejects blank input
+            positions.append(position)
+    
+    if not positions:
+        return results
+    
+    if category_matrix is None:
+        for position in positions:
+            results[position] = (original_categories[position], confidences[position], "Category embeddings unavailable")
+        return results
+    
+    try:
+        comment_matrix = await embed_texts(
+            client, [str(comments[position]) for position in positions], current_app.config['EMBEDDING_MODEL']
         )
-        comment_embedding = np.array(comment_embedding_response.data[0].embedding)
         
-        # Calculate similarity with all categories
-        similarities = {}
-        for category in category_titles:
-            category_desc = get_category_description(category, category_titles)
+        # Cosine similarity of every comment with every category in one matrix product
+        similarities = comment_matrix @ category_matrix.T
+        best_positions = similarities.argmax(axis=1)
+        best_similarities = similarities[np.arange(len(positions)), best_positions]
+        
+        for row, position in enumerate(positions):
+            best_category = category_titles[best_positions[row]]
+            best_similarity = float(best_similarities[row])
+            original_category = original_categories[position]
             
-            category_embedding_response = await client.embeddings.create(
-                input=f"{category}: {category_desc}",
-                model="text-embedding-3-small"
-            )
-            category_embedding = np.array(category_embedding_response.data[0].embedding)
+            # Log if semantic analysis suggests different category
+            if original_category and best_category != original_category:
+                original_similarity = float(similarities[row, category_titles.index(original_category)]) if original_category in category_titles else 0
+                current_app.logger.info(f"Semantic analysis suggests '{best_category}' (sim: {best_similarity:.3f}) instead of '{original_category}' (sim: {original_similarity:.3f}) for: '{comments[position]}'")
             
-            # Calculate cosine similarity
-            similarity = np.dot(comment_embedding, category_embedding) / (
-                np.linalg.norm(comment_embedding) * np.linalg.norm(category_embedding)
-            )
-            similarities[category] = similarity
-        
-        # Find best match
-        best_category = max(similarities, key=similarities.get)
-        best_similarity = similarities[best_category]
-        
-        # Log if semantic analysis suggests different category
-        if original_category and best_category != original_category:
-            current_app.logger.info(f"Semantic analysis suggests '{best_category}' (sim: {best_similarity:.3f}) instead of '{original_category}' (sim: {similarities.get(original_category, 0):.3f}) for: '{comment}'")
-        
-        # Convert similarity to confidence percentage
-        semantic_confidence = int(best_similarity * 100)
-        
-        return best_category, semantic_confidence, f"Semantic similarity: {best_similarity:.3f}"
+            # Convert similarity to confidence percentage
+            results[position] = (best_category, int(best_similarity * 100), f"Semantic similarity: {best_similarity:.3f}")
         
     except Exception as e:
         current_app.logger.error(f"Semantic category selection failed: {e}")
-        return original_category, confidence, f"Semantic analysis failed: {e}"
+        for position in positions:
+            results[position] = (original_categories[position], confidences[position], f"Semantic analysis failed: {e}")
+    
+    return results
 
 def get_category_description(category_title, category_titles):
     """Get a description for semantic validation"""
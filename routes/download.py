@@ -2,18 +2,15 @@ from flask import Blueprint, send_file, jsonify, current_app, request, render_te
 import os
 import io
 import base64
-import json
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from PIL import Image as PILImage
+import importlib.util
 from routes.upload import upload_sessions
-from openai import OpenAI
-from chart_generator import generate_chart_image
+from frame_storage import classified_frame
+from report_index import get_report_index
+from insights import request_insights
 
-# Always use ReportLab for PDF generation for better cross-platform compatibility
+# Always use ReportLab for PDF generation for better cross-platform compatibility.
+# ReportLab, matplotlib (chart_generator) and svglib are imported on first use so they
+# don't slow down startup; warmup.py loads them in the background once the server is up.
 
 download_bp = Blueprint('download', __name__)
 
@@ -26,10 +23,10 @@ def download_csv(session_id):
         
         session = upload_sessions[session_id]
         
-        if session.get('classified_data') is None:
+        if session.get('labels') is None:
             return jsonify({'error': 'No classification data available'}), 400
         
-        df = session['classified_data']
+        df = classified_frame(session)
         
         # Create CSV file in memory
         csv_buffer = io.StringIO()
@@ -66,7 +63,7 @@ def download_pdf_report(session_id):
         
         session = upload_sessions[session_id]
         
-        if session.get('classified_data') is None:
+        if session.get('labels') is None:
             return jsonify({'error': 'No classification data available'}), 400
         
         # Get chart image data if provided (for POST requests)
@@ -77,7 +74,9 @@ def download_pdf_report(session_id):
                 chart_image_data = json_data['chart_image']
         
         # Generate PDF report
-        pdf_buffer = generate_pdf_report(session, chart_image_data)
+        index = get_report_index(upload_sessions, session_id)
+        insights, insights_pending = request_insights(current_app._get_current_object(), upload_sessions, session_id)
+        pdf_buffer = generate_pdf_report(session, index, insights, insights_pending, chart_image_data)
         
         # Generate filename
         original_filename = session['filename']
@@ -104,61 +103,36 @@ def preview_report(session_id):
         
         session = upload_sessions[session_id]
         
-        if session.get('classified_data') is None:
+        if session.get('labels') is None:
             return jsonify({'error': 'No classification data available'}), 400
         
         # Get data
-        df = session['classified_data']
         categories = session['categories']
         verbatim_col = session['verbatim_column']
+        index = get_report_index(upload_sessions, session_id)
         filename = session['filename']
         
-        # Generate insights
-        insights = generate_insights_with_gpt4o(session)
+        # Insights are generated in the background; render a placeholder until they're ready
+        insights, insights_pending = request_insights(current_app._get_current_object(), upload_sessions, session_id)
         
         # Prepare category data for template
-        category_counts = df['Comment Category'].value_counts()
+        category_counts = index['counts']
         category_data = []
         
         for cat in categories:
             title = cat['title']
-            description = cat['description']
-            count = category_counts.get(title, 0)
-            percentage = (count / len(df)) * 100 if len(df) > 0 else 0
-            
-            # Get sample quotes with row numbers
-            category_df = df[df['Comment Category'] == title]
-            sample_quotes = []
-            if len(category_df) > 0:
-                # Get the first 3 non-empty comments with their original row numbers
-                sample_data = category_df[category_df[verbatim_col].notna() & 
-                                        (category_df[verbatim_col].astype(str).str.len() > 0)].head(3)
-                
-                for _, row in sample_data.iterrows():
-                    quote = str(row[verbatim_col])
-                    row_num = row.name + 2  # +2 because pandas index is 0-based and CSV has header
-                    
-                    # Truncate very long quotes
-                    if len(quote) > 200:
-                        quote = quote[:200] + "..."
-                    
-                    sample_quotes.append({
-                        'text': quote,
-                        'row_num': row_num
-                    })
-            
             category_data.append({
                 'title': title,
-                'description': description,
-                'count': count,
-                'percentage': percentage,
-                'sample_quotes': sample_quotes
+                'description': cat['description'],
+                'count': category_counts.get(title, 0),
+                'percentage': index['percentages'].get(title, 0),
+                'sample_quotes': sample_quotes(index, title)
             })
         
         # Add "No Comment" if present
         if 'No Comment' in category_counts:
             count = category_counts['No Comment']
-            percentage = (count / len(df)) * 100
+            percentage = index['percentages']['No Comment']
             category_data.append({
                 'title': 'No Comment',
                 'description': 'Empty, blank, or missing comments',
@@ -170,9 +144,10 @@ def preview_report(session_id):
         # Render HTML template
         return render_template('report.html',
                              filename=filename,
-                             total_responses=len(df),
+                             total_responses=index['total_rows'],
                              verbatim_column=verbatim_col,
                              insights=insights,
+                             insights_pending=insights_pending,
                              category_data=category_data,
                              chart_data=None)  # No chart data for preview
         
@@ -180,175 +155,55 @@ def preview_report(session_id):
         current_app.logger.error(f"Report preview error: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
-def generate_insights_with_gpt4o(session):
-    """Generate key insights and opportunities using GPT-4o"""
-    try:
-        if not current_app.config.get('OPENAI_API_KEY'):
-            return None
-        
-        client = OpenAI(api_key=current_app.config['OPENAI_API_KEY'])
-        
-        # Prepare data for analysis
-        df = session['classified_data']
-        categories = session['categories']
-        verbatim_col = session['verbatim_column']
-        
-        # Get category distribution
-        category_counts = df['Comment Category'].value_counts()
-        total_responses = len(df)
-        
-        # Get sample quotes per category (more for analysis)
-        category_data = []
-        for cat in categories:
-            title = cat['title']
-            description = cat['description']
-            count = category_counts.get(title, 0)
-            percentage = (count / total_responses) * 100 if total_responses > 0 else 0
-            
-            # Get more sample quotes for better analysis
-            category_df = df[df['Comment Category'] == title]
-            sample_comments = []
-            if len(category_df) > 0:
-                samples = category_df[verbatim_col].dropna().astype(str)
-                samples = samples[samples.str.len() > 0].head(25).tolist()
-                sample_comments = samples
-            
-            category_data.append({
-                'title': title,
-                'description': description,
-                'count': count,
-                'percentage': percentage,
-                'samples': sample_comments
-            })
-        
-        # Prepare analysis prompt
-        analysis_data = {
-            'total_responses': total_responses,
-            'categories': category_data,
-            'verbatim_column': verbatim_col
-        }
-        
-        system_prompt = """You are an expert customer experience analyst. Analyze survey data to provide actionable insights and opportunities.
-
-Your analysis should be:
-- Clear and actionable for business decision-makers
-- Focused on key issues and opportunities
-- Based on specific criticisms and feedback found in the sample comments
-- Written in plain business language
-- Cite specific themes and patterns from the actual comments provided
-
-CRITICAL: Respond ONLY with a valid JSON object. Do not include any markdown formatting, explanations, or text outside the JSON. The response must start with { and end with }.
-
-Provide your response as a JSON object with these sections:
-{
-  "key_insights": [
-    "4-6 bullet points highlighting specific patterns and themes from the comments"
-  ],
-  "priority_opportunities": [
-    "4-5 specific, actionable recommendations based on the feedback patterns"
-  ],
-  "sentiment_summary": "Brief overview of overall customer sentiment with specific observations",
-  "risk_areas": [
-    "3-4 areas that need immediate attention based on recurring complaints"
-  ]
-}
+def sample_quotes(index, title, limit=3):
+    """The first non-empty comments of a category with their spreadsheet row numbers"""
+    quotes = []
+    for row_label, quote in index['samples'].get(title, [])[:limit]:
+        # Truncate very long quotes
+        if len(quote) > 200:
+            quote = quote[:200] + "..."
+        
+        # +2 because pandas index is 0-based and CSV has header
+        quotes.append({'text': quote, 'row_num': row_label + 2})
+    return quotes
 
-Focus on specific criticisms, complaints, and suggestions found in the sample comments. Reference actual issues mentioned by customers."""
-
-        user_prompt = f"""Analyze this customer feedback data:
-
-SURVEY DETAILS:
-- Total responses: {analysis_data['total_responses']}
-- Feedback column: {analysis_data['verbatim_column']}
-
-CATEGORY BREAKDOWN:
-"""
-
-        for cat in category_data:
-            user_prompt += f"""
-{cat['title']} ({cat['count']} responses, {cat['percentage']:.1f}%):
-- Description: {cat['description']}
-- Sample comments: {cat['samples'][:25]}
-"""
-
-        user_prompt += """
-
-Analyze the sample comments thoroughly and provide insights focusing on:
-1. What specific pain points and criticisms are customers expressing?
-2. What patterns emerge across the feedback categories?
-3. Which operational issues appear most frequently in the comments?
-4. What specific improvements are customers requesting?
-5. Which problems should be prioritized based on frequency and severity of complaints?
-6. What positive feedback can guide future improvements?
-
-Pay close attention to recurring themes, specific service failures, and actionable suggestions within the actual customer comments provided."""
-
-        # Make the API call
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        
-        # Parse the JSON response
-        insights_text = response.choices[0].message.content.strip()
-        
-        # Try to extract JSON from the response (handle markdown code blocks)
-        try:
-            # First, try direct JSON parsing
-            insights = json.loads(insights_text)
-            return insights
-        except json.JSONDecodeError:
-            # Try to extract JSON from markdown code blocks
-            import re
-            json_match = re.search(r'```json\s*(.*?)\s*```', insights_text, re.DOTALL)
-            if json_match:
-                try:
-                    insights = json.loads(json_match.group(1))
-                    return insights
-                except json.JSONDecodeError:
-                    pass
-            
-            # Try to find JSON object in the text (look for { ... })
-            json_match = re.search(r'\{.*\}', insights_text, re.DOTALL)
-            if json_match:
-                try:
-                    insights = json.loads(json_match.group(0))
-                    return insights
-                except json.JSONDecodeError:
-                    pass
-            
-            current_app.logger.warning(f"GPT-4o response was not valid JSON, using fallback. Response: {insights_text[:200]}...")
-            return {
-                "key_insights": ["Analysis completed but formatting issue occurred"],
-                "priority_opportunities": ["Review detailed category breakdown for specific areas to address"],
-                "sentiment_summary": "Mixed feedback with areas for improvement identified",
-                "risk_areas": ["Review individual categories for specific issues"]
-            }
-            
-    except Exception as e:
-        current_app.logger.error(f"Error generating insights with GPT-4o: {e}")
-        return None
+def chart_flowable(image_bytes, image_format, width, height, max_width=6 * 72):
+    """A ReportLab flowable for a rendered chart of width x height points, scaled to at most max_width"""
+    from reportlab.platypus import Image
+    
+    if image_format == 'svg':
+        # Embedded as vector graphics
+        from svglib.svglib import svg2rlg
+        drawing = svg2rlg(io.BytesIO(image_bytes))
+        scale = min(1, max_width / drawing.width)
+        drawing.scale(scale, scale)
+        drawing.width, drawing.height = drawing.width * scale, drawing.height * scale
+        return drawing
+    
+    scale = min(1, max_width / width)
+    return Image(io.BytesIO(image_bytes), width=width * scale, height=height * scale)
 
-def generate_pdf_report(session, chart_image_data=None):
+def generate_pdf_report(session, index, insights=None, insights_pending=False, chart_image_data=None):
     """Generate a PDF report of the classification results using ReportLab"""
-    return generate_pdf_with_reportlab(session, chart_image_data)
+    return generate_pdf_with_reportlab(session, index, insights, insights_pending, chart_image_data)
 
 
-def generate_pdf_with_reportlab(session, chart_image_data=None):
+def generate_pdf_with_reportlab(session, index, insights=None, insights_pending=False, chart_image_data=None):
     """Generate a PDF report using ReportLab with improved styling"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from chart_generator import generate_chart_image, png_size
+    
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1*inch)
     
     # Get data
-    df = session['classified_data']
     categories = session['categories']
     verbatim_col = session['verbatim_column']
+    total_rows = index['total_rows']
     filename = session['filename']
     
     # Build story (content)
@@ -392,12 +247,11 @@ def generate_pdf_with_reportlab(session, chart_image_data=None):
     
     # File information
     story.append(Paragraph(f"<b>File:</b> {filename}", styles['Normal']))
-    story.append(Paragraph(f"<b>Total Responses:</b> {len(df)}", styles['Normal']))
+    story.append(Paragraph(f"<b>Total Responses:</b> {total_rows}", styles['Normal']))
     story.append(Paragraph(f"<b>Verbatim Column:</b> {verbatim_col}", styles['Normal']))
     story.append(Spacer(1, 20))
     
-    # Generate and add insights if OpenAI is available
-    insights = generate_insights_with_gpt4o(session)
+    # Add insights if OpenAI is available and they have been generated
     if insights:
         story.append(Paragraph("Executive Summary", heading_style))
         story.append(Spacer(1, 10))
@@ -442,6 +296,10 @@ def generate_pdf_with_reportlab(session, chart_image_data=None):
                 story.append(Paragraph(f"• {risk}", bullet_style))
             story.append(Spacer(1, 20))
         
+        story.append(Spacer(1, 20))
+    elif insights_pending:
+        story.append(Paragraph("Executive Summary", heading_style))
+        story.append(Paragraph("<i>Insights are still being generated. Download the report again in a moment to include them.</i>", styles['Normal']))
         story.append(Spacer(1, 20))
     else:
         # Show a note if insights are not available
@@ -456,18 +314,19 @@ def generate_pdf_with_reportlab(session, chart_image_data=None):
     
     # Prepare table data
     table_data = [['Category', 'Count', 'Percentage']]
-    category_counts = df['Comment Category'].value_counts()
+    category_counts = index['counts']
+    percentages = index['percentages']
     
     for cat in categories:
         title = cat['title']
         count = category_counts.get(title, 0)
-        percentage = (count / len(df)) * 100 if len(df) > 0 else 0
+        percentage = percentages.get(title, 0)
         table_data.append([title, str(count), f"{percentage:.1f}%"])
     
     # Add "No Comment" if present
     if 'No Comment' in category_counts:
         count = category_counts['No Comment']
-        percentage = (count / len(df)) * 100
+        percentage = percentages['No Comment']
         table_data.append(['No Comment', str(count), f"{percentage:.1f}%"])
     
     # Create and style table with improved styling
@@ -495,41 +354,31 @@ def generate_pdf_with_reportlab(session, chart_image_data=None):
         category_data_for_chart = []
         for cat in categories:
             title = cat['title']
-            count = category_counts.get(title, 0)
-            percentage = (count / len(df)) * 100 if len(df) > 0 else 0
             category_data_for_chart.append({
                 'title': title,
-                'count': count,
-                'percentage': percentage
+                'count': category_counts.get(title, 0),
+                'percentage': percentages.get(title, 0)
             })
         
         # Add "No Comment" if present
         if 'No Comment' in category_counts:
             count = category_counts['No Comment']
-            percentage = (count / len(df)) * 100
+            percentage = percentages['No Comment']
             category_data_for_chart.append({
                 'title': 'No Comment',
                 'count': count,
                 'percentage': percentage
             })
         
-        # Generate chart image using matplotlib
-        chart_data = generate_chart_image(category_data_for_chart, chart_type='horizontal_bar')
-        
-        # Decode base64 image data
-        image_bytes = base64.b64decode(chart_data)
-        
-        # Create PIL Image to get dimensions
-        pil_image = PILImage.open(io.BytesIO(image_bytes))
-        
-        # Calculate appropriate size for PDF (max 6 inches wide)
-        max_width = 6 * inch
-        aspect_ratio = pil_image.height / pil_image.width
-        img_width = min(max_width, pil_image.width * 0.75)  # 0.75 points per pixel
-        img_height = img_width * aspect_ratio
-        
-        # Create ReportLab Image
-        chart_image = Image(io.BytesIO(image_bytes), width=img_width, height=img_height)
+        # Generate chart image using matplotlib (cached by the counts); SVG needs svglib
+        image_format = current_app.config.get('CHART_FORMAT', 'png')
+        if image_format == 'svg' and importlib.util.find_spec('svglib') is None:
+            image_format = 'png'
+        image_bytes, width, height = generate_chart_image(
+            category_data_for_chart, chart_type='horizontal_bar',
+            image_format=image_format, dpi=current_app.config.get('CHART_DPI', 150)
+        )
+        chart_image = chart_flowable(image_bytes, image_format, width, height)
         
         story.append(Paragraph("Category Distribution Chart", heading_style))
         story.append(Spacer(1, 10))
@@ -544,17 +393,9 @@ def generate_pdf_with_reportlab(session, chart_image_data=None):
                 image_data = chart_image_data.split(',')[1]  # Remove data:image/png;base64, prefix
                 image_bytes = base64.b64decode(image_data)
                 
-                # Create PIL Image to get dimensions
-                pil_image = PILImage.open(io.BytesIO(image_bytes))
-                
-                # Calculate appropriate size for PDF (max 6 inches wide)
-                max_width = 6 * inch
-                aspect_ratio = pil_image.height / pil_image.width
-                img_width = min(max_width, pil_image.width * 0.75)  # 0.75 points per pixel
-                img_height = img_width * aspect_ratio
-                
-                # Create ReportLab Image
-                chart_image = Image(io.BytesIO(image_bytes), width=img_width, height=img_height)
+                # Browser canvas pixels are 0.75 points
+                width, height = png_size(image_bytes)
+                chart_image = chart_flowable(image_bytes, 'png', width * 0.75, height * 0.75)
                 
                 story.append(Paragraph("Category Distribution Chart", heading_style))
                 story.append(Spacer(1, 10))
@@ -580,13 +421,10 @@ def generate_pdf_with_reportlab(session, chart_image_data=None):
         story.append(Spacer(1, 5))
         
         # Get sample quotes with row numbers
-        category_df = df[df['Comment Category'] == title]
-        if len(category_df) > 0:
-            # Get the first 3 non-empty comments with their original row numbers
-            sample_data = category_df[category_df[verbatim_col].notna() & 
-                                    (category_df[verbatim_col].astype(str).str.len() > 0)].head(3)
+        if category_counts.get(title, 0) > 0:
+            quotes = sample_quotes(index, title)
             
-            if len(sample_data) > 0:
+            if quotes:
                 # Create a bullet style for quotes (similar to executive summary)
                 quote_bullet_style = ParagraphStyle(
                     'QuoteBullet',
@@ -600,16 +438,9 @@ def generate_pdf_with_reportlab(session, chart_image_data=None):
                     leading=16
                 )
                 
-                for _, row in sample_data.iterrows():
-                    quote = str(row[verbatim_col])
-                    row_num = row.name + 2  # +2 because pandas index is 0-based and CSV has header
-                    
-                    # Truncate very long quotes
-                    if len(quote) > 200:
-                        quote = quote[:200] + "..."
-                    
+                for quote in quotes:
                     # Format as bullet with row number
-                    story.append(Paragraph(f"• \"{quote}\" <i>(Row {row_num})</i>", quote_bullet_style))
+                    story.append(Paragraph(f"• \"{quote['text']}\" <i>(Row {quote['row_num']})</i>", quote_bullet_style))
             else:
                 story.append(Paragraph("No sample quotes available.", styles['Normal']))
         else:
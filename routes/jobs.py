@@ -0,0 +1,47 @@
+from flask import Blueprint, jsonify, current_app
+from job_queue import get_job_queue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List queued and running jobs"""
+    try:
+        queue = get_job_queue(current_app._get_current_object())
+        return jsonify({'jobs': queue.list()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Job list error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of a job"""
+    try:
+        queue = get_job_queue(current_app._get_current_object())
+        job = queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        if job['status'] == 'queued':
+            job['queue_position'] = queue.queue_position(job)
+        
+        return jsonify(job), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Job status error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@jobs_bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        queue = get_job_queue(current_app._get_current_object())
+        if queue.get(job_id) is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(queue.cancel(job_id)), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Job cancel error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
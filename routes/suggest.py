@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
-from openai import OpenAI
 import json
 import random
 from routes.upload import upload_sessions
+from frame_storage import session_frame
 
 suggest_bp = Blueprint('suggest', __name__)
 
@@ -14,13 +14,13 @@ def suggest_categories(session_id):
             return jsonify({'error': 'Session not found'}), 404
         
         session = upload_sessions[session_id]
-        df = session['dataframe']
         verbatim_col = session['verbatim_column']
         
-        if not verbatim_col or verbatim_col not in df.columns:
+        if not verbatim_col or verbatim_col not in session['columns']:
             return jsonify({'error': 'Verbatim column not set or invalid'}), 400
         
-        # Get sample comments
+        # Get sample comments (only the verbatim column is loaded)
+        df = session_frame(session, [verbatim_col])
         comments = df[verbatim_col].dropna().astype(str)
         comments = comments[comments.str.len() > 10]  # Filter out very short comments
         
@@ -46,8 +46,8 @@ def suggest_categories(session_id):
                 "description": "Empty, blank, or missing comments"
             })
         
-        # Store categories in session
-        session['categories'] = categories
+        # Store categories in session (the report index is rebuilt for them on next use)
+        upload_sessions.patch(session_id, {'categories': categories, 'report_index': None})
         
         return jsonify({
             'session_id': session_id,
@@ -94,21 +94,11 @@ def update_categories(session_id):
         current_app.logger.info(f"Session ID: {session_id}")
         current_app.logger.info(f"Categories being stored: {categories}")
         
-        # Get session data, modify it, and store it back
-        session_data = upload_sessions[session_id]
-        if session_data is None:
-            current_app.logger.error(f"Session data is None for session {session_id}")
-            return jsonify({'error': 'Session data not found'}), 404
-        
-        # Create a copy to avoid reference issues
-        session_data_copy = dict(session_data)
-        session_data_copy['categories'] = categories
-        
-        # Store the updated session data
-        upload_sessions[session_id] = session_data_copy
+        # Store the updated categories
+        upload_sessions.patch(session_id, {'categories': categories, 'report_index': None})
         
         # Verify categories were stored
-        stored_session = upload_sessions[session_id]
+        stored_session = upload_sessions.get(session_id)
         current_app.logger.info(f"Categories after storage: {stored_session.get('categories') if stored_session else 'Session is None'}")
         
         # Double-check the storage worked
@@ -150,6 +140,7 @@ def debug_session(session_id):
 def generate_categories_with_llm(sample_comments):
     """Use OpenAI to generate categories from sample comments"""
     try:
+        from openai import OpenAI
         client = OpenAI(api_key=current_app.config['OPENAI_API_KEY'])
         
         comments_text = "\n".join([f"- {comment}" for comment in sample_comments])
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, current_app
 from routes.upload import upload_sessions
+from report_index import get_report_index
 
 summary_bp = Blueprint('summary', __name__)
 
@@ -12,14 +13,13 @@ def get_summary_json(session_id):
         
         session = upload_sessions[session_id]
         
-        if not session.get('classified_data') is not None:
+        if session.get('labels') is None:
             return jsonify({'error': 'No classification data available'}), 400
         
-        df = session['classified_data']
+        # Category statistics come from the index built when the labels were stored
+        index = get_report_index(upload_sessions, session_id)
         categories = session['categories']
-        
-        # Generate category statistics
-        category_counts = df['Comment Category'].value_counts().to_dict()
+        category_counts = index['counts']
         
         # Create category list with counts
         category_list = []
@@ -46,8 +46,8 @@ def get_summary_json(session_id):
         summary_data = {
             'session_id': session_id,
             'filename': session['filename'],
-            'total_rows': len(df),
-            'total_with_comments': len(df[df['Comment Category'] != 'No Comment']),
+            'total_rows': index['total_rows'],
+            'total_with_comments': index['total_rows'] - category_counts.get('No Comment', 0),
             'categories': category_list,
             'generated_at': current_app.config.get('CURRENT_TIME', ''),
             'verbatim_column': session['verbatim_column']
@@ -68,18 +68,18 @@ def get_report_data(session_id):
         
         session = upload_sessions[session_id]
         
-        if session.get('classified_data') is None:
+        if session.get('labels') is None:
             return jsonify({'error': 'No classification data available'}), 400
         
-        df = session['classified_data']
         categories = session['categories']
         verbatim_col = session['verbatim_column']
+        index = get_report_index(upload_sessions, session_id)
         
         # Generate detailed report
         report_data = {
             'session_id': session_id,
             'filename': session['filename'],
-            'total_rows': len(df),
+            'total_rows': index['total_rows'],
             'verbatim_column': verbatim_col,
             'categories': []
         }
@@ -87,37 +87,27 @@ def get_report_data(session_id):
         # Get category statistics and samples
         for cat in categories:
             title = cat['title']
-            category_df = df[df['Comment Category'] == title]
-            count = len(category_df)
             
             # Get sample quotes (up to 5)
-            samples = []
-            if count > 0:
-                sample_comments = category_df[verbatim_col].dropna().astype(str)
-                sample_comments = sample_comments[sample_comments.str.len() > 0]
-                samples = sample_comments.head(5).tolist()
-            
-            # Calculate percentage
-            percentage = (count / len(df)) * 100 if len(df) > 0 else 0
+            samples = [text for _, text in index['samples'].get(title, [])[:5]]
             
             category_data = {
                 'title': title,
                 'description': cat['description'],
-                'count': count,
-                'percentage': round(percentage, 1),
+                'count': index['counts'].get(title, 0),
+                'percentage': round(index['percentages'].get(title, 0), 1),
                 'sample_quotes': samples
             }
             
             report_data['categories'].append(category_data)
         
         # Add "No Comment" category if present
-        no_comment_df = df[df['Comment Category'] == 'No Comment']
-        if len(no_comment_df) > 0:
+        if index['counts'].get('No Comment', 0) > 0:
             no_comment_data = {
                 'title': 'No Comment',
                 'description': 'Rows with empty or missing comments',
-                'count': len(no_comment_df),
-                'percentage': round((len(no_comment_df) / len(df)) * 100, 1),
+                'count': index['counts']['No Comment'],
+                'percentage': round(index['percentages']['No Comment'], 1),
                 'sample_quotes': []
             }
             report_data['categories'].append(no_comment_data)
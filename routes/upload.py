@@ -1,21 +1,38 @@
 from flask import Blueprint, request, jsonify, current_app
 import os
 import uuid
+import time
+import threading
 import pandas as pd
 from werkzeug.utils import secure_filename
-from utils import allowed_file, detect_verbatim_col, load_excel_file
+from utils import allowed_file, detect_verbatim_col, load_excel_file, column_text_stats
+from ingest import xlsx_sheet_names, UploadStalled
+from session_store import Store
+from progress_events import ProgressBroker
+from frame_storage import save_frame, add_columns, session_memory_usage
 
 upload_bp = Blueprint('upload', __name__)
 
-# Simple in-memory session storage
-upload_sessions = {}
+# Session storage shared by all blueprints (in-memory or on-disk, see SESSION_BACKEND).
+# Uploaded data lives in a columnar file referenced by 'data_path'; classification results
+# are a single 'labels' Series keyed by row index, with their per-category 'report_index'.
+upload_sessions = Store('sessions', frame_fields=('labels', 'report_index'), bounded=True)
 
-# Progress tracking for classification
-classification_progress = {}
+# Progress tracking for classification; every write wakes the progress streams
+progress_events = ProgressBroker()
+classification_progress = Store('progress', broker=progress_events)
+
+# Parsing progress of asynchronous uploads
+upload_progress = Store('upload_progress')
 
 @upload_bp.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload and initial processing"""
+    """
+    Handle file upload and initial processing.
+    
+    With ?async=1 the session ID is returned as soon as the file is saved and parsing
+    continues in the background; poll /sessions/<id>/upload for its progress.
+    """
     try:
         # Check if file is present
         if 'file' not in request.files:
@@ -36,9 +53,40 @@ def upload_file():
         filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{session_id}_{filename}")
         file.save(filepath)
         
+        # Optional columns to carry through to the export alongside the verbatim column
+        passthrough = request.form.getlist('passthrough_columns')
+        if len(passthrough) == 1 and ',' in passthrough[0]:
+            passthrough = [col.strip() for col in passthrough[0].split(',')]
+        
+        # Worksheet to read from Excel workbooks (name or position, default the first)
+        sheet = request.form.get('sheet') or None
+        
+        if request.args.get('async') in ('1', 'true'):
+            upload_progress[session_id] = {
+                'status': 'parsing',
+                'filename': filename,
+                'rows_read': 0,
+                'bytes_consumed': 0,
+                'bytes_total': os.path.getsize(filepath),
+                'current_step': 'Reading file...',
+                'start_time': time.time()
+            }
+            thread = threading.Thread(
+                target=parse_upload_async,
+                args=(current_app._get_current_object(), session_id, filepath, filename, sheet, passthrough)
+            )
+            thread.daemon = True
+            thread.start()
+            
+            return jsonify({
+                'session_id': session_id,
+                'filename': filename,
+                'status': 'parsing'
+            }), 202
+        
         # Load and analyze file
         try:
-            df = load_excel_file(filepath)
+            response_data = parse_upload(session_id, filepath, filename, sheet, passthrough)
         except ValueError as e:
             # Clean up file
             os.remove(filepath)
@@ -48,39 +96,157 @@ def upload_file():
             os.remove(filepath)
             return jsonify({'error': f'Failed to read file: {str(e)}'}), 400
         
-        # Detect verbatim column
-        verbatim_col, is_confident = detect_verbatim_col(df)
-        
-        # Store session data
-        upload_sessions[session_id] = {
-            'filepath': filepath,
-            'filename': filename,
-            'dataframe': df,
-            'verbatim_column': verbatim_col,
-            'column_detection_confident': is_confident,
-            'total_rows': len(df),
-            'columns': list(df.columns),
-            'categories': None,
-            'classified_data': None
-        }
-        
-        # Prepare response
-        response_data = {
-            'session_id': session_id,
-            'filename': filename,
-            'total_rows': len(df),
-            'columns': list(df.columns),
-            'detected_verbatim_column': verbatim_col,
-            'detection_confident': is_confident,
-            'preview': df.head(5).to_dict('records') if len(df) > 0 else []
-        }
-        
         return jsonify(response_data), 200
         
     except Exception as e:
         current_app.logger.error(f"Upload error: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+@upload_bp.route('/sessions/<session_id>/upload', methods=['GET'])
+def get_upload_status(session_id):
+    """Parsing progress of an asynchronous upload (rows read, bytes consumed, result when ready)"""
+    try:
+        if session_id in upload_progress:
+            return jsonify(upload_progress[session_id]), 200
+        if session_id in upload_sessions:
+            return jsonify({'status': 'ready'}), 200
+        return jsonify({'error': 'Session not found'}), 404
+        
+    except Exception as e:
+        current_app.logger.error(f"Upload status error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+def parse_upload(session_id, filepath, filename, sheet=None, passthrough=(), on_progress=None, on_step=None):
+    """
+    Parse a saved upload, detect its verbatim column and create the session.
+    
+    Detection runs on a sample, then only the kept columns are read. Returns the upload
+    response; raises ValueError for problems with the file itself.
+    """
+    def step(message):
+        if on_step is not None:
+            on_step(message)
+    
+    sample_rows = current_app.config.get('UPLOAD_SAMPLE_ROWS', 1000)
+    step('Sampling rows...')
+    sheets = xlsx_sheet_names(filepath) if filepath.endswith('.xlsx') else None
+    sample = load_excel_file(filepath, nrows=sample_rows, sheet=sheet)
+    all_columns = list(sample.columns)
+    
+    unknown = [col for col in passthrough if col not in all_columns]
+    if unknown:
+        raise ValueError(f"Columns not found in file: {', '.join(map(str, unknown))}")
+    
+    # Detect verbatim column from per-column stats (kept for the column selector)
+    step('Detecting verbatim column...')
+    column_stats = column_text_stats(sample, sample_rows)
+    verbatim_col, is_confident = detect_verbatim_col(sample, column_stats)
+    
+    if current_app.config.get('UPLOAD_KEEP_COLUMNS', 'all') == 'all' and not passthrough:
+        keep_columns = all_columns
+    else:
+        keep_columns = [col for col in all_columns if col == verbatim_col or col in passthrough]
+    step('Reading rows...')
+    df = load_excel_file(
+        filepath, columns=keep_columns, text_columns=[verbatim_col] if verbatim_col else [],
+        sheet=sheet, on_progress=on_progress
+    )
+    
+    # Persist the parsed data once in columnar form; endpoints load columns on demand
+    step('Saving data...')
+    data_path = save_frame(df, os.path.join(current_app.config['UPLOAD_FOLDER'], f"{session_id}_data"))
+    
+    # Store session data
+    upload_sessions[session_id] = {
+        'filepath': filepath,
+        'filename': filename,
+        'sheet': sheet,
+        'data_path': data_path,
+        'verbatim_column': verbatim_col,
+        'column_detection_confident': is_confident,
+        'total_rows': len(df),
+        'columns': all_columns,
+        'loaded_columns': list(df.columns),
+        'column_stats': column_stats,
+        'categories': None,
+        'labels': None,
+        'report_index': None
+    }
+    
+    # Prepare response
+    return {
+        'session_id': session_id,
+        'filename': filename,
+        'total_rows': len(df),
+        'columns': all_columns,
+        'sheets': sheets,
+        'column_stats': column_stats,
+        'detected_verbatim_column': verbatim_col,
+        'detection_confident': is_confident,
+        'preview': df.head(5).to_dict('records') if len(df) > 0 else []
+    }
+
+def parse_upload_async(app, session_id, filepath, filename, sheet, passthrough):
+    """Parse an upload in a background thread, publishing progress to upload_progress"""
+    with app.app_context():
+        def on_progress(rows_read, bytes_consumed):
+            fields = {'rows_read': rows_read}
+            if bytes_consumed is not None:
+                fields['bytes_consumed'] = bytes_consumed
+            upload_progress.patch(session_id, fields)
+        
+        def on_step(message):
+            upload_progress.patch(session_id, {'current_step': message})
+        
+        try:
+            result = parse_upload(session_id, filepath, filename, sheet, passthrough, on_progress, on_step)
+            upload_progress.patch(session_id, {
+                'status': 'ready',
+                'rows_read': result['total_rows'],
+                'bytes_consumed': upload_progress[session_id].get('bytes_total', 0),
+                'current_step': 'Upload processed',
+                'result': result
+            })
+            current_app.logger.info(f"Parsed upload {filename} for session {session_id}")
+        except UploadStalled as e:
+            # Keep the bytes received so far; the next chunk restarts parsing
+            current_app.logger.warning(f"Upload parsing for session {session_id} paused: {e}")
+            upload_progress.patch(session_id, {
+                'status': 'stalled',
+                'current_step': 'Waiting for the upload to resume...'
+            })
+        except Exception as e:
+            current_app.logger.error(f"Background upload parsing error: {e}")
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            message = str(e) if isinstance(e, ValueError) else f'Failed to read file: {str(e)}'
+            upload_progress.patch(session_id, {
+                'status': 'failed',
+                'current_step': message,
+                'error': message
+            })
+
+@upload_bp.route('/sessions/<session_id>/column', methods=['GET'])
+def get_column_options(session_id):
+    """List the columns available for the verbatim column, with their sampled text stats"""
+    try:
+        if session_id not in upload_sessions:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        session = upload_sessions[session_id]
+        column_stats = session.get('column_stats') or {}
+        
+        return jsonify({
+            'session_id': session_id,
+            'verbatim_column': session['verbatim_column'],
+            'detection_confident': session['column_detection_confident'],
+            'columns': [{'name': col, **column_stats.get(col, {})} for col in session['columns']]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Column options error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
 @upload_bp.route('/sessions/<session_id>/column', methods=['POST'])
 def update_verbatim_column(session_id):
     """Allow user to manually override the detected verbatim column"""
@@ -98,9 +264,22 @@ def update_verbatim_column(session_id):
         if column_name not in session['columns']:
             return jsonify({'error': 'Column not found in dataset'}), 400
         
-        # Update session
-        session['verbatim_column'] = column_name
-        session['column_detection_confident'] = True  # User override is always confident
+        # Columns skipped at upload are read from the original file on demand
+        fields = {}
+        if column_name not in session.get('loaded_columns', session['columns']):
+            extra = load_excel_file(
+                session['filepath'], columns=[column_name], text_columns=[column_name], sheet=session.get('sheet')
+            )
+            fields['data_path'] = add_columns(session, extra)
+            fields['loaded_columns'] = session['loaded_columns'] + [column_name]
+        
+        # Update session (user override is always confident)
+        upload_sessions.patch(session_id, {
+            **fields,
+            'verbatim_column': column_name,
+            'column_detection_confident': True,
+            'report_index': None
+        })
         
         return jsonify({
             'session_id': session_id,
@@ -129,9 +308,23 @@ def get_session_info(session_id):
             'verbatim_column': session['verbatim_column'],
             'detection_confident': session['column_detection_confident'],
             'has_categories': session['categories'] is not None,
-            'has_classifications': session['classified_data'] is not None
+            'has_classifications': session.get('labels') is not None,
+            'memory': session_memory_usage(session)
         }), 200
         
     except Exception as e:
         current_app.logger.error(f"Session get error: {e}")
-        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@upload_bp.route('/metrics/sessions', methods=['GET'])
+def get_session_metrics():
+    """Memory usage and eviction metrics of the session store in this worker"""
+    try:
+        return jsonify({
+            'sessions': upload_sessions.stats(),
+            'progress': classification_progress.stats()
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Session metrics error: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
@@ -0,0 +1,408 @@
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from flask import current_app
+
+def estimate_size(value):
+    """Approximate bytes held in memory by a stored value (pandas objects measured deeply)"""
+    if hasattr(value, 'memory_usage'):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+class MemoryBackend:
+    """
+    Process-local storage; every worker has its own copy.
+
+    With a memory budget, entries are kept in least-recently-used order and the coldest
+    ones are spilled to pickle files in spill_folder once the budget is exceeded; they are
+    loaded back transparently the next time they are read.
+    """
+
+    shared = False
+
+    def __init__(self, memory_budget=0, spill_folder=None, table='items'):
+        self.memory_budget = memory_budget
+        self.spill_folder = spill_folder
+        self.table = table
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._spilled = set()
+        self._lock = threading.RLock()
+        self.evictions = 0
+        self.reloads = 0
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_folder, f"{key}_{self.table}_spill.pkl")
+
+    def _spill_enabled(self):
+        return bool(self.memory_budget and self.spill_folder)
+
+    def _touch(self, key):
+        """Mark an entry as recently used, reloading it if it was spilled"""
+        if key in self._items:
+            self._items.move_to_end(key)
+            return True
+        if key not in self._spilled:
+            return False
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            # Spill file removed by the upload cleanup: the entry has expired
+            self._spilled.discard(key)
+            return False
+        with open(path, 'rb') as f:
+            self._items[key] = pickle.load(f)
+        os.remove(path)
+        self._spilled.discard(key)
+        self._sizes[key] = estimate_size(self._items[key])
+        self.reloads += 1
+        self._enforce_budget(keep=key)
+        return True
+
+    def _enforce_budget(self, keep=None):
+        """Spill least-recently-used entries until resident size fits the budget"""
+        if not self._spill_enabled():
+            return
+        while sum(self._sizes.values()) > self.memory_budget and len(self._items) > 1:
+            key = next(iter(self._items))
+            if key == keep:
+                self._items.move_to_end(key)
+                key = next(iter(self._items))
+            path = self._spill_path(key)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self._items[key], f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            del self._items[key]
+            self._sizes.pop(key, None)
+            self._spilled.add(key)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            return self._items[key] if self._touch(key) else None
+
+    def set(self, key, value):
+        with self._lock:
+            self._discard_spill(key)
+            self._items[key] = value
+            self._items.move_to_end(key)
+            self._sizes[key] = estimate_size(value) if self._spill_enabled() else 0
+            self._enforce_budget(keep=key)
+
+    def _discard_spill(self, key):
+        if key in self._spilled:
+            self._spilled.discard(key)
+            path = self._spill_path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+            self._sizes.pop(key, None)
+            self._discard_spill(key)
+
+    def contains(self, key):
+        with self._lock:
+            if key in self._items:
+                return True
+            return key in self._spilled and os.path.exists(self._spill_path(key))
+
+    def keys(self):
+        with self._lock:
+            return list(self._items) + list(self._spilled)
+
+    def patch(self, key, fields):
+        with self._lock:
+            if not self._touch(key):
+                self._items[key] = {}
+            item = self._items[key]
+            item.update(fields)
+            self._sizes[key] = estimate_size(item) if self._spill_enabled() else 0
+            self._enforce_budget(keep=key)
+            return item
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'resident_entries': len(self._items),
+                'spilled_entries': len(self._spilled),
+                'resident_bytes': sum(self._sizes.values()),
+                'memory_budget_bytes': self.memory_budget,
+                'evictions': self.evictions,
+                'reloads': self.reloads
+            }
+
+class SQLiteBackend:
+    """
+    Storage shared by every worker on the box, kept in a SQLite database.
+
+    Values are dicts. Entries listed in frame_fields (DataFrames) are written to their
+    own files next to the database and only the file reference is stored in the row;
+    each process keeps the frames it has loaded (least recently used ones are dropped
+    beyond memory_budget) and re-reads them only when the file changes.
+    """
+
+    shared = True
+
+    def __init__(self, db_path, table, frame_fields=(), memory_budget=0):
+        self.db_path = db_path
+        self.table = table
+        self.frame_fields = frame_fields
+        self.folder = os.path.dirname(db_path)
+        self.memory_budget = memory_budget
+        self._frames = OrderedDict()
+        self._frame_sizes = {}
+        self._frames_lock = threading.Lock()
+        self.evictions = 0
+        self.reloads = 0
+
+    def _remember_frame(self, path, entry):
+        """Cache a loaded frame, dropping the least recently used ones beyond the budget"""
+        with self._frames_lock:
+            self._frames[path] = entry
+            self._frames.move_to_end(path)
+            if not self.memory_budget:
+                return
+            self._frame_sizes[path] = estimate_size(entry[1])
+            while sum(self._frame_sizes.values()) > self.memory_budget and len(self._frames) > 1:
+                oldest, _ = self._frames.popitem(last=False)
+                self._frame_sizes.pop(oldest, None)
+                self.evictions += 1
+
+    def _forget_frame(self, path):
+        with self._frames_lock:
+            self._frames.pop(path, None)
+            self._frame_sizes.pop(path, None)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'key TEXT PRIMARY KEY, '
+            'data BLOB NOT NULL, '
+            'updated_at REAL NOT NULL)'
+        )
+        return conn
+
+    def _read_row(self, conn, key):
+        row = conn.execute(f'SELECT data FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _write_row(self, conn, key, stored):
+        conn.execute(
+            f'INSERT OR REPLACE INTO {self.table} (key, data, updated_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(stored, protocol=pickle.HIGHEST_PROTOCOL), time.time())
+        )
+
+    def _frame_path(self, key, field):
+        return os.path.join(self.folder, f"{key}_{field}.pkl")
+
+    def _store_frames(self, key, value):
+        """Write changed DataFrames to disk, returning the row to store"""
+        stored = dict(value)
+        frames = {}
+        for field in self.frame_fields:
+            frame = stored.pop(field, None)
+            if frame is None:
+                continue
+            path = self._frame_path(key, field)
+            with self._frames_lock:
+                cached = self._frames.get(path)
+            if cached is None or cached[1] is not frame:
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+                self._remember_frame(path, (os.path.getmtime(path), frame))
+            frames[field] = path
+        stored['__frames__'] = frames
+        return stored
+
+    def _load_frames(self, stored):
+        value = dict(stored)
+        for field, path in value.pop('__frames__', {}).items():
+            mtime = os.path.getmtime(path)
+            with self._frames_lock:
+                cached = self._frames.get(path)
+            if cached is None or cached[0] != mtime:
+                with open(path, 'rb') as f:
+                    cached = (mtime, pickle.load(f))
+                self.reloads += 1
+            self._remember_frame(path, cached)
+            value[field] = cached[1]
+        return value
+
+    def _frames_exist(self, stored):
+        return all(os.path.exists(path) for path in stored.get('__frames__', {}).values())
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            stored = self._read_row(conn, key)
+        finally:
+            conn.close()
+        if stored is None or not self._frames_exist(stored):
+            return None
+        return self._load_frames(stored)
+
+    def set(self, key, value):
+        stored = self._store_frames(key, value)
+        conn = self._connect()
+        try:
+            self._write_row(conn, key, stored)
+        finally:
+            conn.close()
+
+    def delete(self, key):
+        conn = self._connect()
+        try:
+            stored = self._read_row(conn, key)
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+        finally:
+            conn.close()
+        for path in (stored or {}).get('__frames__', {}).values():
+            self._forget_frame(path)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def contains(self, key):
+        conn = self._connect()
+        try:
+            stored = self._read_row(conn, key)
+        finally:
+            conn.close()
+        # Frame files removed by the upload cleanup mean the session has expired
+        return stored is not None and self._frames_exist(stored)
+
+    def keys(self):
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute(f'SELECT key FROM {self.table}')]
+        finally:
+            conn.close()
+
+    def patch(self, key, fields):
+        """Read-modify-write of selected fields inside one transaction"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            stored = self._read_row(conn, key) or {'__frames__': {}}
+            frames = stored.pop('__frames__', {})
+            frame_updates = {field: value for field, value in fields.items() if field in self.frame_fields}
+            stored.update({field: value for field, value in fields.items() if field not in self.frame_fields})
+            updated = self._store_frames(key, frame_updates)
+            for field, value in frame_updates.items():
+                if value is None:
+                    frames.pop(field, None)
+            frames.update(updated['__frames__'])
+            stored['__frames__'] = frames
+            self._write_row(conn, key, stored)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return self._load_frames(stored)
+
+    def stats(self):
+        with self._frames_lock:
+            cached_frames = len(self._frames)
+            resident_bytes = sum(self._frame_sizes.values())
+        return {
+            'backend': 'disk',
+            'entries': len(self.keys()),
+            'cached_frames': cached_frames,
+            'resident_bytes': resident_bytes,
+            'memory_budget_bytes': self.memory_budget,
+            'evictions': self.evictions,
+            'reloads': self.reloads
+        }
+
+class Store(MutableMapping):
+    """
+    Dict-like store whose backend is picked from SESSION_BACKEND on first use.
+
+    Reads return the stored dict; writes must go through item assignment or patch()
+    so they persist with shared backends (where reads return copies) and so memory-
+    bounded stores can account for them. With bounded=True the store is held to
+    SESSION_MEMORY_BUDGET_MB. Writes are published to broker (a ProgressBroker), if
+    given, so subscribers are woken on change.
+    """
+
+    def __init__(self, table, frame_fields=(), bounded=False, broker=None):
+        self.table = table
+        self.frame_fields = frame_fields
+        self.bounded = bounded
+        self.broker = broker
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = create_backend(current_app.config, self.table, self.frame_fields, self.bounded)
+        return self._backend
+
+    @property
+    def shared(self):
+        return self.backend.shared
+
+    def __getitem__(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backend.set(key, value)
+        if self.broker is not None:
+            self.broker.publish(key, dict(value))
+
+    def __delitem__(self, key):
+        self.backend.delete(key)
+        if self.broker is not None:
+            self.broker.discard(key)
+
+    def __contains__(self, key):
+        return self.backend.contains(key)
+
+    def __iter__(self):
+        return iter(self.backend.keys())
+
+    def __len__(self):
+        return len(self.backend.keys())
+
+    def patch(self, key, fields):
+        """Update some fields of an entry (creating it if needed) and return the result"""
+        value = self.backend.patch(key, fields)
+        if self.broker is not None:
+            self.broker.publish(key, dict(value))
+        return value
+
+    def stats(self):
+        """Memory and eviction metrics of the backend"""
+        return self.backend.stats()
+
+def create_backend(config, table, frame_fields=(), bounded=False):
+    backend = config.get('SESSION_BACKEND', 'memory')
+    memory_budget = int(config.get('SESSION_MEMORY_BUDGET_MB', 0) * 1024 * 1024) if bounded else 0
+    if backend == 'memory':
+        return MemoryBackend(memory_budget, config.get('UPLOAD_FOLDER'), table)
+    if backend == 'disk':
+        return SQLiteBackend(config['SESSION_DB_PATH'], table, frame_fields, memory_budget)
+    raise ValueError(f"Unknown SESSION_BACKEND '{backend}'")
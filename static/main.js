@@ -93,10 +93,13 @@ async function handleFile(file) {
         return;
     }
 
-    if (file.size > 5 * 1024 * 1024) {
-        showError('upload-error', 'File size must be less than 5MB');
+    const uploadSettings = document.getElementById('upload-area').dataset;
+    const maxUploadMb = parseInt(uploadSettings.maxChunkedUploadMb, 10) || 5;
+    if (file.size > maxUploadMb * 1024 * 1024) {
+        showError('upload-error', `File size must be less than ${maxUploadMb}MB`);
         return;
     }
+    const chunkSize = parseInt(uploadSettings.chunkSize, 10) || 4 * 1024 * 1024;
 
     // Show uploading state
     const uploadArea = document.getElementById('upload-area');
@@ -107,23 +110,33 @@ async function handleFile(file) {
     document.getElementById('upload-loading').classList.add('show');
     clearError('upload-error');
     
-    // Simulate upload progress
-    simulateUploadProgress();
+    setUploadProgress(0, 'Uploading...');
 
     try {
-        // Upload file
-        const formData = new FormData();
-        formData.append('file', file);
+        let data;
+        if (file.size > chunkSize) {
+            // Large files are sent in resumable chunks
+            const sessionId = await uploadInChunks(file, chunkSize);
+            data = await waitForUploadParsing(sessionId);
+        } else {
+            // Upload file; the server parses it in the background
+            const formData = new FormData();
+            formData.append('file', file);
 
-        const response = await fetch('/upload', {
-            method: 'POST',
-            body: formData
-        });
+            const response = await fetch('/upload?async=1', {
+                method: 'POST',
+                body: formData
+            });
 
-        const data = await response.json();
+            data = await response.json();
 
-        if (!response.ok) {
-            throw new Error(data.error || 'Upload failed');
+            if (!response.ok) {
+                throw new Error(data.error || 'Upload failed');
+            }
+
+            if (response.status === 202) {
+                data = await waitForUploadParsing(data.session_id);
+            }
         }
 
         // Success
@@ -194,10 +207,19 @@ function displayFileInfo(data) {
 
     // Populate column selector
     verbatimSelect.innerHTML = '';
+    const columnStats = data.column_stats || {};
     data.columns.forEach(col => {
         const option = document.createElement('option');
         option.value = col;
         option.textContent = col;
+        if (columnStats[col]) {
+            // Help pick the free-text column: average text length and an example value
+            const stats = columnStats[col];
+            option.textContent = `${col} (avg ${Math.round(stats.avg_length)} chars)`;
+            if (stats.samples && stats.samples.length > 0) {
+                option.title = stats.samples[0];
+            }
+        }
         if (col === data.detected_verbatim_column) {
             option.selected = true;
         }
@@ -493,8 +515,8 @@ function startProgressStream() {
             fetchClassificationResults();
         }
         
-        // Handle failure
-        if (progress.status === 'failed') {
+        // Handle failure, cancellation or a session that no longer exists
+        if (progress.status === 'failed' || progress.status === 'cancelled' || progress.status === 'expired') {
             eventSource.close();
             document.getElementById('classify-loading').classList.remove('show');
             
@@ -504,13 +526,17 @@ function startProgressStream() {
                 detailedProgressElement.remove();
             }
             
-            showError('classify-error', progress.error || 'Classification failed');
+            showError('classify-error', progress.error || (progress.status === 'cancelled' ? 'Classification cancelled' : 'Classification failed'));
             document.getElementById('classify-btn').disabled = false;
         }
     };
     
     eventSource.onerror = function() {
-        eventSource.close();
+        // The browser reconnects on its own, sending Last-Event-ID so the server resumes
+        // from the last update received; nothing to do unless it gave up
+        if (eventSource.readyState === EventSource.CLOSED) {
+            console.warn('Progress stream closed');
+        }
     };
 }
 
@@ -562,12 +588,30 @@ function updateDetailedProgress(progress) {
     detailedHTML += '<div>';
     detailedHTML += `<div style="margin-bottom: 8px;"><strong>Progress:</strong> ${progress.processed || 0} / ${progress.total || 0} comments</div>`;
     detailedHTML += `<div style="margin-bottom: 8px;"><strong>Remaining:</strong> ${progress.remaining || 0} comments</div>`;
+    if (progress.unique_comments !== undefined) {
+        detailedHTML += `<div style="margin-bottom: 8px;"><strong>Unique comments:</strong> ${progress.unique_comments} (${Math.round((progress.duplicate_reduction || 0) * 100)}% duplicates)</div>`;
+    }
+    if (progress.resolved_locally !== undefined) {
+        detailedHTML += `<div style="margin-bottom: 8px;"><strong>Embedding match:</strong> ${progress.resolved_locally} rows resolved, ${progress.escalated || 0} escalated to AI</div>`;
+    }
+    if (progress.cache_hits !== undefined) {
+        detailedHTML += `<div style="margin-bottom: 8px;"><strong>Cached:</strong> ${progress.cache_hits} reused, ${progress.cache_misses || 0} sent to AI</div>`;
+    }
     detailedHTML += '</div>';
     
     // Right column
     detailedHTML += '<div>';
-    detailedHTML += `<div style="margin-bottom: 8px;"><strong>Processing rate:</strong> ${progress.processing_rate || 0} comments/sec</div>`;
+    detailedHTML += `<div style="margin-bottom: 8px;"><strong>Processing rate:</strong> ${progress.processing_rate || 0} comments/sec${progress.average_rate !== undefined ? ` (average ${progress.average_rate})` : ''}</div>`;
     detailedHTML += `<div style="margin-bottom: 8px;"><strong>Time remaining:</strong> ${formatTimeRemaining(progress.estimated_time_remaining)}</div>`;
+    if (progress.concurrency_limit !== undefined) {
+        detailedHTML += `<div style="margin-bottom: 8px;"><strong>Concurrent requests:</strong> ${progress.concurrency || 0} / ${progress.concurrency_limit}${progress.throttle_events ? ` (throttled ${progress.throttle_events}x)` : ''}</div>`;
+    }
+    if (progress.phase_timings && Object.keys(progress.phase_timings).length > 0) {
+        const phases = Object.entries(progress.phase_timings)
+            .map(([name, timing]) => `${name.replace(/_/g, ' ')} ${timing.seconds}s`)
+            .join(', ');
+        detailedHTML += `<div style="margin-bottom: 8px;"><strong>Phases:</strong> ${phases}</div>`;
+    }
     detailedHTML += '</div>';
     
     detailedHTML += '</div>';
@@ -847,27 +891,111 @@ function getStepName(stepNumber) {
 }
 
 // Simulate upload progress
-function simulateUploadProgress() {
+function setUploadProgress(percent, text) {
     const progressBar = document.getElementById('upload-progress');
     const progressText = document.getElementById('upload-progress-text');
-    let progress = 0;
     
-    const interval = setInterval(() => {
-        progress += Math.random() * 15 + 5; // Random increment between 5-20%
-        if (progress > 100) progress = 100;
-        
-        if (progressBar) {
-            progressBar.style.width = `${progress}%`;
+    if (progressBar) {
+        progressBar.style.width = `${percent}%`;
+    }
+    
+    if (progressText) {
+        progressText.textContent = text;
+    }
+}
+
+async function sha256Hex(buffer) {
+    // crypto.subtle is only available in secure contexts; checksums are optional
+    if (!window.crypto || !window.crypto.subtle) return null;
+    const digest = await window.crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Send a file through the chunked upload API, resuming after failed chunks
+async function uploadInChunks(file, chunkSize) {
+    const initResponse = await fetch('/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    const upload = await initResponse.json();
+    if (!initResponse.ok) {
+        throw new Error(upload.error || 'Upload failed');
+    }
+
+    const maxAttempts = 5;
+    let offset = 0;
+    let attempts = 0;
+    while (offset < file.size) {
+        const buffer = await file.slice(offset, offset + chunkSize).arrayBuffer();
+        const headers = { 'Content-Type': 'application/octet-stream' };
+        const checksum = await sha256Hex(buffer);
+        if (checksum) headers['X-Chunk-SHA256'] = checksum;
+
+        try {
+            const response = await fetch(`/uploads/${upload.upload_id}?offset=${offset}`, {
+                method: 'PUT',
+                headers: headers,
+                body: buffer
+            });
+            const result = await response.json();
+            if (response.status === 409 && result.received !== undefined) {
+                // Out of sync with the server: continue from what it has
+                offset = result.received;
+                continue;
+            }
+            if (!response.ok) {
+                throw new Error(result.error || 'Chunk upload failed');
+            }
+            offset = result.received;
+            attempts = 0;
+            setUploadProgress(100 * offset / file.size, `Uploading... ${Math.round(100 * offset / file.size)}%`);
+        } catch (error) {
+            attempts += 1;
+            if (attempts >= maxAttempts) throw error;
+            // Back off, then resume from the server's position
+            await new Promise(resolve => setTimeout(resolve, 1000 * attempts));
+            const statusResponse = await fetch(`/uploads/${upload.upload_id}`);
+            if (statusResponse.ok) {
+                offset = (await statusResponse.json()).received;
+            }
         }
-        
-        if (progressText) {
-            progressText.textContent = `${Math.round(progress)}%`;
+    }
+
+    const completeResponse = await fetch(`/uploads/${upload.upload_id}/complete`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({})
+    });
+    const completed = await completeResponse.json();
+    if (!completeResponse.ok) {
+        throw new Error(completed.error || 'Upload failed');
+    }
+    return completed.session_id;
+}
+
+// Poll the parse status of an asynchronous upload until it is ready
+async function waitForUploadParsing(sessionId) {
+    while (true) {
+        const response = await fetch(`/sessions/${sessionId}/upload`);
+        const status = await response.json();
+
+        if (!response.ok || status.status === 'failed') {
+            throw new Error(status.error || 'Failed to process file');
         }
-        
-        if (progress >= 100) {
-            clearInterval(interval);
+
+        if (status.status === 'ready') {
+            setUploadProgress(100, '100%');
+            return status.result;
         }
-    }, 200); // Update every 200ms
+
+        // Byte position is only known for CSV files
+        const percent = status.bytes_total ? Math.min(99, 100 * status.bytes_consumed / status.bytes_total) : 0;
+        const rows = (status.rows_read || 0).toLocaleString();
+        setUploadProgress(percent, `${status.current_step || 'Processing...'} ${rows} rows read`);
+
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
 }
 
 // Edit category
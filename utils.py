@@ -1,20 +1,58 @@
 import pandas as pd
+import numpy as np
 import re
 import os
-from openai import OpenAI
 from flask import current_app
+from ingest import read_csv_sample, read_csv_columns, read_xlsx_columns, UploadStalled
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
-def detect_verbatim_col(df):
+# Number of non-empty example values kept per column
+COLUMN_SAMPLE_VALUES = 3
+
+# Vectorized length of each value's string form over an object array
+_text_length = np.frompyfunc(lambda value: len(str(value)), 1, 1)
+
+def column_text_stats(df, sample_rows=1000):
+    """
+    Per-column text statistics over the first sample_rows rows, computed in one pass.
+
+    Returns {column: {'avg_length', 'non_empty_ratio', 'samples'}}; avg_length counts
+    missing cells as empty text.
+    """
+    sample = df.head(sample_rows)
+    if sample.empty:
+        return {col: {'avg_length': 0.0, 'non_empty_ratio': 0.0, 'samples': []} for col in df.columns}
+    
+    # Blank out missing cells first: astype(str) keeps NaN as a float on pandas 3
+    present_mask = sample.notna()
+    lengths = _text_length(sample.astype(object).where(present_mask, '').to_numpy()).astype(np.int64).mean(axis=0)
+    present = present_mask.to_numpy().mean(axis=0)
+    
+    stats = {}
+    for position, col in enumerate(sample.columns):
+        values = sample.iloc[:, position]
+        stats[col] = {
+            'avg_length': round(float(lengths[position]), 1),
+            'non_empty_ratio': round(float(present[position]), 3),
+            'samples': values.dropna().astype(str).head(COLUMN_SAMPLE_VALUES).tolist()
+        }
+    return stats
+
+def detect_verbatim_col(df, stats=None):
     """
     Detect verbatim column using three-step strategy:
     1. Strict match for known headers
     2. Heuristic: long free-text + keyword matching
     3. LLM fallback
+    
+    stats are the column_text_stats of df (computed here if not given).
     """
+    if stats is None:
+        stats = column_text_stats(df)
+    
     # Step 1: Strict match
     strict_patterns = [
         "how can we improve this service",
@@ -24,7 +62,7 @@ def detect_verbatim_col(df):
     ]
     
     for col in df.columns:
-        col_clean = col.strip().lower()
+        col_clean = str(col).strip().lower()
         if any(pattern in col_clean for pattern in strict_patterns):
             return col, True
     
@@ -33,13 +71,12 @@ def detect_verbatim_col(df):
     keyword_cols = []
     
     for col in df.columns:
-        # Check average cell length (convert to string first)
-        avg_length = df[col].astype(str).str.len().mean()
-        if avg_length > 25:
+        # Check average cell length
+        if stats[col]['avg_length'] > 25:
             long_cols.append(col)
         
         # Check for keywords
-        if re.search(r"(improve|comment|feedback|verbatim|suggestion|opinion)", col, re.I):
+        if re.search(r"(improve|comment|feedback|verbatim|suggestion|opinion)", str(col), re.I):
             keyword_cols.append(col)
     
     # Prefer columns that are both long and contain keywords
@@ -51,12 +88,12 @@ def detect_verbatim_col(df):
         return candidates[0], False
     elif len(candidates) > 1:
         # If multiple candidates, prefer the one with longest average text
-        best_col = max(candidates, key=lambda col: df[col].astype(str).str.len().mean())
+        best_col = max(candidates, key=lambda col: stats[col]['avg_length'])
         return best_col, False
     
     # Step 3: LLM fallback
     try:
-        col = llm_pick_verbatim(df.head(200))
+        col = llm_pick_verbatim(df.head(200), stats)
         if col and col in df.columns:
             return col, False
     except Exception:
@@ -64,24 +101,27 @@ def detect_verbatim_col(df):
     
     # Final fallback: return first column with some text content
     for col in df.columns:
-        if df[col].astype(str).str.len().mean() > 10:
+        if stats[col]['avg_length'] > 10:
             return col, False
     
     return df.columns[0] if len(df.columns) > 0 else None, False
 
-def llm_pick_verbatim(df_sample):
+def llm_pick_verbatim(df_sample, stats=None):
     """Use OpenAI to identify the verbatim column"""
     if not current_app.config.get('OPENAI_API_KEY'):
         return None
     
     try:
+        from openai import OpenAI
         client = OpenAI(api_key=current_app.config['OPENAI_API_KEY'])
         
         # Prepare sample data
+        if stats is None:
+            stats = column_text_stats(df_sample)
         columns_info = []
         for col in df_sample.columns:
-            sample_values = df_sample[col].dropna().astype(str).head(3).tolist()
-            avg_length = df_sample[col].astype(str).str.len().mean()
+            sample_values = stats[col]['samples']
+            avg_length = stats[col]['avg_length']
             columns_info.append(f"Column '{col}': avg_length={avg_length:.1f}, samples={sample_values}")
         
         prompt = f"""You are analyzing survey data columns to identify which contains free-text verbatim comments.
@@ -112,19 +152,37 @@ Return only the exact column name, nothing else."""
         current_app.logger.error(f"LLM verbatim detection failed: {e}")
         return None
 
-def load_excel_file(filepath):
-    """Load Excel file with fallback engines for legacy formats"""
+def load_excel_file(filepath, columns=None, text_columns=(), nrows=None, sheet=None, on_progress=None):
+    """
+    Load Excel or CSV file with fallback engines for legacy formats.
+    
+    columns limits which columns are read, text_columns are read as strings without
+    type inference, nrows reads only the first rows (for sampling) and sheet selects
+    an Excel worksheet by name or position. on_progress(rows_read, bytes_consumed) is
+    called while streaming .csv and .xlsx files (bytes_consumed is None for .xlsx).
+    """
     try:
-        # Try openpyxl first (for modern .xlsx files)
+        # Stream modern .xlsx files with openpyxl's read-only mode
         if filepath.endswith('.xlsx'):
-            return pd.read_excel(filepath, engine='openpyxl')
+            return read_xlsx_columns(filepath, columns, text_columns, nrows=nrows, sheet=sheet, on_progress=on_progress)
         elif filepath.endswith('.xls'):
             # Use xlrd for legacy .xls files
-            return pd.read_excel(filepath, engine='xlrd')
+            return pd.read_excel(filepath, engine='xlrd', usecols=columns, nrows=nrows,
+                                 sheet_name=sheet if sheet is not None else 0)
         elif filepath.endswith('.csv'):
-            return pd.read_csv(filepath)
+            if nrows is not None:
+                return read_csv_sample(filepath, nrows)
+            # Stream large CSVs, keeping only the needed columns
+            return read_csv_columns(
+                filepath, columns, text_columns,
+                chunk_rows=current_app.config.get('CSV_CHUNK_ROWS', 100000),
+                on_progress=on_progress
+            )
         else:
             raise ValueError("Unsupported file format")
+    except UploadStalled:
+        # Not a problem with the file; the caller restarts parsing when chunks arrive again
+        raise
     except Exception as e:
         error_msg = str(e).lower()
         
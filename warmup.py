@@ -0,0 +1,40 @@
+import importlib
+import threading
+import time
+
+# Heavy dependencies the report, chart and LLM code paths import on first use
+DEFERRED_MODULES = (
+    'openai',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+    'chart_generator',
+    'reportlab.platypus',
+    'reportlab.lib.styles',
+    'svglib.svglib',
+)
+
+def warm_imports(logger, modules=DEFERRED_MODULES, delay=0):
+    """Import deferred modules so the first report or classification request doesn't pay for them"""
+    time.sleep(delay)
+    started = time.perf_counter()
+    for name in modules:
+        module_started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # Optional dependencies (e.g. svglib) may be missing
+            continue
+        logger.debug(f"Pre-warmed {name} in {time.perf_counter() - module_started:.2f}s")
+    logger.info(f"Pre-warmed deferred imports in {time.perf_counter() - started:.2f}s")
+
+def start_warmup(app):
+    """Pre-warm deferred imports in a background thread once the server is accepting requests"""
+    if not app.config.get('WARMUP_IMPORTS', True):
+        return
+    thread = threading.Thread(
+        target=warm_imports,
+        args=(app.logger,),
+        kwargs={'delay': app.config.get('WARMUP_DELAY_SECONDS', 1)}
+    )
+    thread.daemon = True
+    thread.start()